@@ -0,0 +1,167 @@
+#!/usr/bin/python
+"""
+Benchmarks fluid-python against fluid-cpp. Both fluids are coupled with the same solid participant, solid-python, via
+preCICE for every combination of the number of cells and the time window size. For every run, the wall time per time
+window and the coupling iterations are measured. If both fluids ran, the maximum deviation of their diameters is
+computed as well, e.g.
+
+    python3 benchmark-fluids.py --N 100 200 400 --time-window-size .01 .005
+
+fluid-cpp has to be built in fluid-cpp/build before.
+"""
+
+from __future__ import division, print_function
+import argparse
+import csv
+import glob
+import itertools
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+
+here = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(here, "fluid-python"))
+from output import readTimeSeries  # noqa: E402
+
+fields = ["fluid", "N", "time_window_size", "time_windows", "wall_time", "wall_time_per_window",
+          "coupling_iterations_per_window", "max_diameter_deviation"]
+
+
+def write_config(filename, time_window_size, max_time):
+    """
+    Writes a copy of precice-config.xml with the given time window size and end time.
+    """
+    with open(os.path.join(here, "precice-config.xml")) as f:
+        config = f.read()
+    config = re.sub(r'(<time-window-size value=")[^"]*"', r'\g<1>{}"'.format(time_window_size), config)
+    config = re.sub(r'(<max-time value=")[^"]*"', r'\g<1>{}"'.format(max_time), config)
+    with open(filename, 'w') as f:
+        f.write(config)
+
+
+def read_iterations(directory):
+    """
+    :return: coupling iterations of every time window from the iterations log of preCICE in directory
+    """
+    for filename in glob.glob(os.path.join(directory, "precice-*-iterations.log")):
+        with open(filename) as f:
+            header = f.readline().split()
+            rows = [line.split() for line in f if line.strip()]
+        if "Iterations" in header and rows:
+            return np.array([int(row[header.index("Iterations")]) for row in rows])
+    return None
+
+
+def read_diameter(fluid):
+    """
+    :return: diameter of all time windows written by the fluid, array of shape (time windows, N+1)
+    """
+    if fluid == "python":
+        return readTimeSeries(os.path.join(here, "fluid-python", "output", "out_fluid_.npz"))[0]["diameter"][:]
+
+    def read_vtk(filename):
+        with open(filename) as f:
+            lines = f.read().split("\n")
+        start = lines.index("SCALARS diameter float") + 2
+        n = int(next(line for line in lines if line.startswith("POINT_DATA")).split()[1])
+        return np.array([float(value) for value in lines[start:start + n]])
+
+    filenames = glob.glob(os.path.join(here, "fluid-cpp", "output", "out_fluid_*.vtk"))
+    filenames.sort(key=lambda filename: int(re.search(r"_(\d+)\.vtk$", filename).group(1)))
+    return np.array([read_vtk(filename) for filename in filenames])
+
+
+def run_case(fluid, N, time_window_size, max_time):
+    """
+    Runs the fluid coupled with solid-python and returns the measurements and the diameter of all time windows.
+    """
+    configurationFileName = os.path.join(here, "precice-config-benchmark.xml")
+    write_config(configurationFileName, time_window_size, max_time)
+    fluid_directory = os.path.join(here, "fluid-" + fluid)
+    solid_directory = os.path.join(here, "solid-python")
+    for filename in glob.glob(os.path.join(here, "fluid-cpp", "output", "out_fluid_*.vtk")) + \
+            glob.glob(os.path.join(solid_directory, "precice-*-iterations.log")):
+        os.remove(filename)
+
+    if fluid == "python":
+        fluid_command = [sys.executable, "FluidSolver.py", configurationFileName, "--N", str(N), "--output-format",
+                         "npz", "--output-in-flight", "0"]
+    else:
+        fluid_command = ["./build/FluidSolver", configurationFileName, str(N)]
+    solid_command = [sys.executable, "SolidSolver.py", configurationFileName, "--N", str(N)]
+
+    with tempfile.TemporaryFile() as fluid_log, tempfile.TemporaryFile() as solid_log:
+        tic = time.perf_counter()
+        solid = subprocess.Popen(solid_command, cwd=solid_directory, stdout=solid_log, stderr=subprocess.STDOUT)
+        fluid_process = subprocess.Popen(fluid_command, cwd=fluid_directory, stdout=fluid_log,
+                                         stderr=subprocess.STDOUT)
+        returncodes = fluid_process.wait(), solid.wait()
+        wall_time = time.perf_counter() - tic
+        if any(returncodes):
+            for name, log in [("fluid-" + fluid, fluid_log), ("solid-python", solid_log)]:
+                log.seek(0)
+                print("Output of {}:".format(name))
+                print(log.read().decode(errors="replace")[-2000:])
+            raise RuntimeError("Run of fluid-{} with N = {}, time window size = {} failed".format(
+                fluid, N, time_window_size))
+    os.remove(configurationFileName)
+
+    time_windows = int(round(max_time / time_window_size))
+    iterations = read_iterations(solid_directory)
+    if iterations is None:
+        iterations = read_iterations(fluid_directory)
+    return {"fluid": fluid, "N": N, "time_window_size": time_window_size, "time_windows": time_windows,
+            "wall_time": wall_time, "wall_time_per_window": wall_time / time_windows,
+            "coupling_iterations_per_window": np.mean(iterations) if iterations is not None else np.nan,
+            "max_diameter_deviation": np.nan}, read_diameter(fluid)
+
+
+parser = argparse.ArgumentParser(description="Benchmarks fluid-python against fluid-cpp, both coupled with \
+                                              solid-python via preCICE.")
+parser.add_argument("--N", help="Numbers of cells.", nargs='+', type=int, default=[100, 200, 400])
+parser.add_argument("--time-window-size", help="Time window sizes.", nargs='+', type=float, default=[.01, .005])
+parser.add_argument("--max-time", help="End time of every run.", type=float, default=1.)
+parser.add_argument("--fluids", help="Fluid participants to run.", nargs='+', choices=['python', 'cpp'],
+                    default=['python', 'cpp'])
+parser.add_argument("--output", help="CSV file the results are written to.", type=str,
+                    default=os.path.join(here, "fluid-python", "output", "benchmark_fluids.csv"))
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+
+    results = []
+    print("{:>8} {:>8} {:>10} {:>16} {:>12} {:>18}".format(
+        "fluid", "N", "window", "time/window [s]", "iterations", "diameter deviation"))
+    for N, time_window_size in itertools.product(args.N, args.time_window_size):
+        diameters = {}
+        case_results = []
+        for fluid in args.fluids:
+            result, diameters[fluid] = run_case(fluid, N, time_window_size, args.max_time)
+            case_results.append(result)
+        if len(diameters) == 2:
+            n = min(diameter.shape[0] for diameter in diameters.values())
+            deviation = np.max(np.abs(diameters["python"][:n] - diameters["cpp"][:n]))
+            for result in case_results:
+                result["max_diameter_deviation"] = deviation
+        for result in case_results:
+            print("{fluid:>8} {N:>8} {time_window_size:>10} {wall_time_per_window:>16.6f} "
+                  "{coupling_iterations_per_window:>12.2f} {max_diameter_deviation:>18.3e}".format(**result))
+        results += case_results
+
+    with open(args.output, 'w') as f:
+        writer = csv.DictWriter(f, fieldnames=fields)
+        writer.writeheader()
+        writer.writerows(results)
+    print("Results written to {}".format(args.output))
+
+    if set(args.fluids) == {"python", "cpp"}:
+        print("")
+        print("Wall time per window of fluid-python relative to fluid-cpp:")
+        for N, time_window_size in itertools.product(args.N, args.time_window_size):
+            times = {result["fluid"]: result["wall_time_per_window"] for result in results
+                     if result["N"] == N and result["time_window_size"] == time_window_size}
+            print("N = {}, time window size = {}: {:.2f}".format(N, time_window_size, times["python"] / times["cpp"]))
@@ -0,0 +1,193 @@
+#!/usr/bin/python
+"""
+Checks the MPI partitioning of solid-python without preCICE, e.g.
+
+    mpirun -n 3 python3 check-partition.py
+
+Every rank runs SolidSolver.py unchanged against a stub of the preCICE Python bindings. Instead of coupling, the stub
+returns a prescribed pressure at the vertices registered by the rank and records the cross section written in the last
+coupling iteration of every time window. The records of all ranks are gathered and compared to the tube law evaluated
+serially on the whole tube for the same pressure. In addition, SolidSolver.py is run with --verify against a reference
+file of this serial result and with --write-reference, whose file is compared to the serial result as well.
+"""
+
+from __future__ import division, print_function
+import argparse
+import os
+import runpy
+import shutil
+import sys
+import tempfile
+import types
+import numpy as np
+from mpi4py import MPI
+
+here = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(here, "fluid-python"))
+from monolithicScheme import tube_law  # noqa: E402
+from thetaScheme import create_grid  # noqa: E402
+from tubeParameters import a0, p0, c_mk, L  # noqa: E402
+
+parser = argparse.ArgumentParser(description="Runs the solid with a stub of preCICE on every MPI rank and compares "
+                                             "the gathered cross section to the serial tube law.")
+parser.add_argument("--N", help="Number of cells.", type=int, default=100)
+parser.add_argument("--grid-stretching", help="Grid stretching, see FluidSolver.py.", type=float, default=0)
+parser.add_argument("--windows", help="Number of time windows.", type=int, default=5)
+parser.add_argument("--iterations", help="Number of coupling iterations per time window.", type=int, default=3)
+parser.add_argument("--tolerance", help="Maximum deviation from the serial tube law relative to its maximum.",
+                    type=float, default=1e-12)
+
+
+def prescribed_pressure(x, window, iteration):
+    """
+    Pressure that the stub sends to the solid, different for every time window and coupling iteration.
+    """
+    return 1e3 * np.sin(2 * np.pi * x / L + window + .1 * iteration)
+
+
+class StubInterface(object):
+    """
+    Stub of precice.Interface for one rank of the solid, supporting the subset used by SolidSolver.py. Every time
+    window takes a fixed number of coupling iterations. The cross section written in the last one is recorded.
+    """
+
+    def __init__(self, windows, iterations, participant_name, configurationFileName, process_index, process_size):
+        comm = MPI.COMM_WORLD
+        assert (process_index, process_size) == (comm.Get_rank(), comm.Get_size())
+        self.windows = windows
+        self.iterations = iterations
+        self.window = 0
+        self.iteration = 0
+        self.x = None
+        self.crossSections = []
+
+    def get_dimensions(self):
+        return 2
+
+    def get_mesh_id(self, mesh_name):
+        return 0
+
+    def get_data_id(self, data_name, mesh_id):
+        return data_name
+
+    def set_mesh_vertices(self, mesh_id, positions):
+        self.x = np.array(positions[:, 0])
+        return np.arange(positions.shape[0])
+
+    def initialize(self):
+        return .01
+
+    def is_action_required(self, action):
+        return action == "read-iteration-checkpoint" and self.iteration > 0
+
+    def mark_action_fulfilled(self, action):
+        pass
+
+    def initialize_data(self):
+        pass
+
+    def is_read_data_available(self):
+        return True
+
+    def write_block_scalar_data(self, data_id, vertex_ids, values):
+        assert data_id == "CrossSectionLength" and len(vertex_ids) == self.x.shape[0]
+        if len(self.crossSections) == self.window:
+            self.crossSections.append(None)
+        self.crossSections[self.window] = np.array(values)  # the last write of the window is kept
+
+    def read_block_scalar_data(self, data_id, vertex_ids):
+        assert data_id == "Pressure" and len(vertex_ids) == self.x.shape[0]
+        return prescribed_pressure(self.x, self.window, self.iteration)
+
+    def advance(self, dt):
+        self.iteration += 1
+        if self.iteration == self.iterations:
+            self.window += 1
+            self.iteration = 0
+        return dt
+
+    def is_coupling_ongoing(self):
+        return self.window < self.windows
+
+    def finalize(self):
+        pass
+
+
+def run_solid(args, argv):
+    """
+    Runs SolidSolver.py on every rank with the stub as precice module.
+
+    :return: stub interface of this rank
+    """
+    interfaces = []
+
+    def create_interface(*arguments):
+        interfaces.append(StubInterface(args.windows, args.iterations, *arguments))
+        return interfaces[-1]
+
+    precice = types.ModuleType("precice")
+    precice.Interface = create_interface
+    precice.action_write_initial_data = lambda: "write-initial-data"
+    precice.action_write_iteration_checkpoint = lambda: "write-iteration-checkpoint"
+    precice.action_read_iteration_checkpoint = lambda: "read-iteration-checkpoint"
+    sys.modules["precice"] = precice
+
+    script = os.path.join(here, "solid-python", "SolidSolver.py")
+    sys.argv = [script, "precice-config.xml", "--N", str(args.N), "--grid-stretching", str(args.grid_stretching)] + argv
+    runpy.run_path(script, run_name="__main__")
+    return interfaces[0]
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    comm = MPI.COMM_WORLD
+    rank = comm.Get_rank()
+
+    # serial tube law for the pressure of the last coupling iteration of every time window
+    x = create_grid(args.N, L, args.grid_stretching)
+    pressure = np.array([prescribed_pressure(x, window, args.iterations - 1) for window in range(args.windows)])
+    serial = np.stack([pressure, tube_law(pressure, a0, p0, c_mk)], axis=1)  # layout of --write-reference
+
+    directory = comm.bcast(tempfile.mkdtemp() if rank == 0 else None, root=0)
+    reference = os.path.join(directory, "reference.npy")
+    written = os.path.join(directory, "written.npy")
+    if rank == 0:
+        np.save(reference, serial)
+    comm.Barrier()
+
+    # SolidSolver.py aborts all ranks if --verify fails
+    try:
+        interface = run_solid(args, ["--verify", reference, "--verify-tolerance", str(args.tolerance),
+                                     "--write-reference", written])
+    except Exception as error:  # the other ranks would wait forever in the next collective operation
+        print("Partition check failed on rank {}: {!r}".format(rank, error))
+        comm.Abort(1)
+
+    gathered = comm.gather((interface.x, interface.crossSections), root=0)
+    if rank == 0:
+        failures = []
+        x_gathered = np.concatenate([x_rank for x_rank, _ in gathered])
+        if x_gathered.shape != x.shape or not np.array_equal(x_gathered, x):
+            failures.append("the ranks do not register the vertices of the tube exactly once and in order")
+        elif any(len(crossSections) != args.windows for _, crossSections in gathered):
+            failures.append("not every rank wrote the cross section of all {} time windows".format(args.windows))
+        else:
+            crossSection = np.concatenate([np.array(crossSections) for _, crossSections in gathered], axis=1)
+            deviation = np.max(np.abs(crossSection - serial[:, 1])) / np.max(np.abs(serial[:, 1]))
+            print("Gathered cross section: relative deviation from the serial tube law {:e}".format(deviation))
+            if deviation > args.tolerance:
+                failures.append("the gathered cross section differs from the serial tube law")
+
+        deviation = np.max(np.abs(np.load(written) - serial)) / np.max(np.abs(serial))
+        print("--write-reference: relative deviation from the serial tube law {:e}".format(deviation))
+        if deviation > args.tolerance:
+            failures.append("the file written with --write-reference differs from the serial tube law")
+
+        shutil.rmtree(directory)
+        for failure in failures:
+            print("Partition check failed: " + failure)
+        if not failures:
+            print("Partition check passed on {} ranks".format(comm.Get_size()))
+    failed = comm.bcast(bool(failures) if rank == 0 else None, root=0)
+    if failed:
+        raise SystemExit(1)
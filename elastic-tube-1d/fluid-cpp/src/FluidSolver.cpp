@@ -2,6 +2,7 @@
 #include "utilities.h"
 
 #include <iostream>
+#include <string>
 #include <vector>
 #include <cmath>
 #include "precice/SolverInterface.hpp"
@@ -13,17 +14,17 @@ int main(int argc, char **argv)
 {
 
   std::cout << "Starting Fluid Solver..." << std::endl;
-  if (argc != 2) {
+  if (argc != 2 && argc != 3) {
     std::cout << std::endl;
-    std::cout << "Fluid: Usage: " << argv[0] << " <configurationFileName>" << std::endl;
+    std::cout << "Fluid: Usage: " << argv[0] << " <configurationFileName> [<N>]" << std::endl;
 
     return -1;
   }
 
   std::string configFileName(argv[1]);
-  int         domainSize  = 100;  //N
+  int         domainSize  = argc == 3 ? std::stoi(argv[2]) : 100;  //N
   int         chunkLength = domainSize + 1;
-  const double kappa      = 100;
+  const double kappa      = domainSize;
   const double L = 10.0; // tube length
 
   const std::string solverName = "Fluid";
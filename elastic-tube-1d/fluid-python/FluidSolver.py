@@ -2,37 +2,25 @@ from __future__ import division, print_function
 import os
 import sys
 import argparse
+import time
 import outputConfiguration as config
-from thetaScheme import perform_partitioned_implicit_trapezoidal_rule_step, perform_partitioned_implicit_euler_step
+from thetaScheme import perform_partitioned_implicit_trapezoidal_rule_step, perform_partitioned_implicit_euler_step, \
+    NonlinearSolverModes, NonlinearSolverState, NonlinearSolverStatistics, StepCache, extrapolate_initial_guess, \
+    create_grid
 import numpy as np
 import tubePlotting
 import matplotlib.pyplot as plt
 import matplotlib.animation as manimation
-from output import writeOutputToVTK
+from periodicSteadyState import PeriodicSteadyStateDetector
+from output import writeOutputToVTK, writeTraceEntry, VTUWriter, AsynchronousWriter, \
+    TimeSeriesWriter
 import precice
 from precice import action_write_initial_data, action_write_iteration_checkpoint, \
     action_read_iteration_checkpoint
-
-# physical properties of the tube
-r0 = 1 / np.sqrt(np.pi)  # radius of the tube
-a0 = r0**2 * np.pi  # cross sectional area
-u0 = 10  # mean velocity
-ampl = 3  # amplitude of varying velocity
-frequency = 10  # frequency of variation
-t_shift = 0  # temporal shift of variation
-p0 = 0  # pressure at outlet
-kappa = 100
-
-L = 10  # length of tube/simulation domain
-N = 100
-dx = L / kappa
-# helper function to create constant cross section
-
-
-def velocity_in(t): return u0 + ampl * np.sin(frequency *
-                                              (t + t_shift) * np.pi)  # inflow velocity
+from tubeParameters import a0, frequency, p0, L, N, velocity_in
 
 
+# helper function to create constant cross section
 def crossSection0(N):
     return a0 * np.ones(N + 1)
 
@@ -40,10 +28,36 @@ def crossSection0(N):
 parser = argparse.ArgumentParser()
 parser.add_argument("configurationFileName", help="Name of the xml precice configuration file.",
                     nargs='?', type=str, default="../precice-config.xml")
+parser.add_argument("--N", help="Number of cells of the tube, has to match SolidSolver.py.", type=int, default=N)
+parser.add_argument("--grid-stretching", help="Let the cells grow geometrically from the inlet to the outlet, \
+                    such that the last cell is about exp(<value>) times longer than the first one. 0 gives a uniform \
+                    grid. Has to match SolidSolver.py.", type=float, default=0)
 parser.add_argument(
     "--enable-plot", help="Show a continuously updated plot of the tube while simulating.", action='store_true')
 parser.add_argument("--write-video", help="Save a video of the simulation as 'writer_test.mp4'. \
                     NOTE: This requires 'enable_plot' to be active!", action='store_true')
+parser.add_argument("--nonlinear-solver", help="Nonlinear solver of the fluid. 'chord' reuses the factorized Jacobian \
+                    across Newton and coupling iterations of a time window.", choices=['newton', 'chord'],
+                    default='newton')
+parser.add_argument("--extrapolate-initial-guess", help="Start Newton's method from the last coupling iterate or from \
+                    an extrapolation of the previous time windows instead of the old time window.", action='store_true')
+parser.add_argument("--write-trace", help="Write statistics of the nonlinear solver and of preCICE advance for every \
+                    time window to 'output/trace_fluid.jsonl'.", action='store_true')
+parser.add_argument("--output-format", help="Format of the output files. 'vtu' writes compressed binary XML VTK files \
+                    and the collection 'output/out_fluid_.pvd' for ParaView, 'vtk' writes legacy ASCII VTK files. \
+                    'npz' appends all time windows to the single compressed archive 'output/out_fluid_.npz'.",
+                    choices=['vtk', 'vtu', 'npz'], default='vtu')
+parser.add_argument("--output-in-flight", help="Number of time windows that may wait for being written to disk by a \
+                    background thread. The solver blocks if the output falls behind further. 0 writes the output \
+                    synchronously.", type=int, default=4)
+parser.add_argument("--periodic-steady-state", help="Tolerance for detecting a periodic steady state by comparing the \
+                    solution with the solution one inflow period earlier. Once the solution is periodic, the output of \
+                    the last period is kept as representative period and no further output is written. The fluid then \
+                    repeats the stored period instead of solving, while the coupling continues until the end time.",
+                    type=float)
+parser.add_argument("--memoize", help="Cache the fluid solutions of a time window and reuse them, if preCICE \
+                    returns a cross section again that is equal within the given relative tolerance, e.g. 1e-12. \
+                    The cache is cleared at the end of every time window.", type=float)
 
 try:
     args = parser.parse_args()
@@ -63,8 +77,20 @@ writeVideoToFile = True if args.write_video else False
 
 print("Plotting Mode: {}".format(plotting_mode))
 
+output_mode = config.OutputModes[args.output_format.upper()]
+print("Output Mode: {}".format(output_mode))
+
+solver_state = NonlinearSolverState(NonlinearSolverModes[args.nonlinear_solver.upper()],
+                                    cache=StepCache(args.memoize) if args.memoize is not None else None)
+print("Nonlinear Solver Mode: {}".format(solver_state.mode))
+
 print("Starting Fluid Solver...")
 
+N = args.N
+kappa = N  # the cells keep the length L / N, like in fluid-cpp
+dx = L / kappa
+if args.grid_stretching != 0:
+    dx = np.diff(create_grid(N, L, args.grid_stretching))  # cell lengths of the non-uniform grid
 print("N: " + str(N))
 
 print("Configure preCICE...")
@@ -82,6 +108,7 @@ crossSectionLength_old = a0 * np.ones(N + 1)
 
 if plotting_mode == config.PlottingModes.VIDEO:
     fig, ax = plt.subplots(1)
+    renderer = tubePlotting.TubeRenderer(ax, N + 1, dx, blit=not writeVideoToFile)
     if writeVideoToFile:
         FFMpegWriter = manimation.writers['imagemagick']
         metadata = dict(title='PulseTube')
@@ -95,11 +122,20 @@ pressureID = interface.get_data_id("Pressure", meshID)
 vertexIDs = np.zeros(N + 1)
 grid = np.zeros([N + 1, dimensions])
 
-grid[:, 0] = np.linspace(0, L, N + 1)  # x component
+grid[:, 0] = create_grid(N, L, args.grid_stretching)  # x component
 grid[:, 1] = 0  # y component, leave blank
 
 vertexIDs = interface.set_mesh_vertices(meshID, grid)
 
+if output_mode is config.OutputModes.VTU:
+    seriesWriter = VTUWriter("out_fluid_", grid[:, 0])
+    outputWriter = AsynchronousWriter(seriesWriter.write, args.output_in_flight)
+elif output_mode is config.OutputModes.NPZ:
+    seriesWriter = TimeSeriesWriter("out_fluid_", grid[:, 0], ["velocity", "pressure", "diameter"])
+    outputWriter = AsynchronousWriter(seriesWriter.write, args.output_in_flight)
+elif output_mode is config.OutputModes.VTK:
+    outputWriter = AsynchronousWriter(writeOutputToVTK, args.output_in_flight)
+
 t = 0
 
 print("Fluid: init precice...")
@@ -123,17 +159,39 @@ velocity_old = velocity_in(
 
 print(crossSectionLength_old)
 
+history = []  # converged (velocity, pressure) of the previous time windows, newest first
+iterate = None  # (velocity, pressure) of the last coupling iteration in the current time window
+trace = []  # solver statistics of the coupling iterations in the current time window
+
+periodic = False  # periodic steady state reached
+if args.periodic_steady_state:
+    period = 2 / frequency  # period of velocity_in
+    detector = PeriodicSteadyStateDetector(int(round(period / precice_dt)), args.periodic_steady_state)
+
 time_it = 0
 while interface.is_coupling_ongoing():
     # When an implicit coupling scheme is used, checkpointing is required
     if interface.is_action_required(action_write_iteration_checkpoint()):
         interface.mark_action_fulfilled(action_write_iteration_checkpoint())
 
-    velocity, pressure, success = perform_partitioned_implicit_euler_step(
-        velocity_old, pressure_old, crossSectionLength_old, crossSectionLength, dx, precice_dt, velocity_in(
-            t + precice_dt), custom_coupling=True)
+    initial_guess = None
+    if args.extrapolate_initial_guess:
+        initial_guess = iterate if iterate is not None else extrapolate_initial_guess(history)
+
+    if periodic:
+        # repeat the solution of one period earlier
+        velocity, pressure, _ = detector.predict()
+        success = True
+        solver_state.statistics = NonlinearSolverStatistics()  # no solve, do not trace the last solve again
+    else:
+        velocity, pressure, success = perform_partitioned_implicit_euler_step(
+            velocity_old, pressure_old, crossSectionLength_old, crossSectionLength, dx, precice_dt, velocity_in(
+                t + precice_dt), custom_coupling=True, solver_state=solver_state, initial_guess=initial_guess)
+    iterate = (velocity, pressure) if success else None
     interface.write_block_scalar_data(pressureID, vertexIDs, pressure)
+    tic = time.perf_counter()
     interface.advance(precice_dt)
+    trace.append(dict(solver_state.statistics.as_dict(), time_advance=time.perf_counter() - tic))
     crossSectionLength = interface.read_block_scalar_data(
         crossSectionLengthID, vertexIDs)
 
@@ -142,21 +200,58 @@ while interface.is_coupling_ongoing():
         interface.mark_action_fulfilled(action_read_iteration_checkpoint())
     else:  # converged, timestep complete
         t += precice_dt
+        # in NEWTON mode every iteration factorizes the Jacobian, the statistics only matter if it is reused
+        if solver_state.mode is NonlinearSolverModes.CHORD:
+            print("Fluid: Newton iterations: {}, Jacobian factorizations: {}".format(
+                solver_state.iterations, solver_state.factorizations))
+        if solver_state.cache is not None:
+            print("Fluid: cache hits: {}, cache misses: {}".format(solver_state.cache.hits, solver_state.cache.misses))
+        solver_state.start_window()
+        if args.write_trace:
+            writeTraceEntry("trace_fluid", {
+                "window": time_it,
+                "time": t,
+                "coupling_iterations": len(trace),
+                "iterations": sum(entry["iterations"] for entry in trace),
+                "time_residual": sum(entry["time_residual"] for entry in trace),
+                "time_jacobian": sum(entry["time_jacobian"] for entry in trace),
+                "time_solve": sum(entry["time_solve"] for entry in trace),
+                "time_advance": sum(entry["time_advance"] for entry in trace),
+                "residuals": [entry["residuals"] for entry in trace]})
+        trace = []
         if plotting_mode is config.PlottingModes.VIDEO:
-            tubePlotting.doPlotting(
-                ax, crossSectionLength_old, velocity_old, pressure_old, dx, t)
+            renderer.update(crossSectionLength_old, velocity_old, pressure_old, t)
             if writeVideoToFile:
                 writer.grab_frame()
-            ax.cla()
+        # new arrays are created for every time window and never modified in place, therefore the output writer can
+        # take them over without copying
         velocity_old = np.copy(velocity)
         pressure_old = np.copy(pressure)
         crossSectionLength_old = np.copy(crossSectionLength)
-        writeOutputToVTK(time_it, "out_fluid_", dx, datanames=["velocity", "pressure", "diameter"], data=[
-            velocity_old, pressure_old, crossSectionLength_old])
+        history = [(velocity_old, pressure_old)] + history[:2]
+        iterate = None
+        write_output = not periodic  # the window completing the representative period is still written
+        # while repeating the period, the detector keeps track of the phase
+        if args.periodic_steady_state and detector.update(velocity_old, pressure_old, crossSectionLength_old) and \
+                not periodic:
+            periodic = True
+            print("Fluid: periodic steady state reached at t = {}, periodic residual: {:e}. Output of the last "
+                  "period is kept.".format(t, detector.residual))
+        if write_output and output_mode in [config.OutputModes.VTU, config.OutputModes.NPZ]:
+            outputWriter.submit(time_it, t, datanames=["velocity", "pressure", "diameter"], data=[
+                velocity_old, pressure_old, crossSectionLength_old])
+        elif write_output and output_mode is config.OutputModes.VTK:
+            outputWriter.submit(time_it, "out_fluid_", dx, datanames=["velocity", "pressure", "diameter"], data=[
+                velocity_old, pressure_old, crossSectionLength_old])
         time_it += 1
 
 print("Exiting FluidSolver")
 
+if output_mode is not config.OutputModes.OFF:
+    outputWriter.finalize()
+if output_mode in [config.OutputModes.VTU, config.OutputModes.NPZ]:
+    seriesWriter.finalize()
+
 if plotting_mode is config.PlottingModes.VIDEO and writeVideoToFile:
     writer.finish()
 
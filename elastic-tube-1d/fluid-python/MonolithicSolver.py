@@ -0,0 +1,89 @@
+from __future__ import division, print_function
+import argparse
+import time
+import numpy as np
+import outputConfiguration as config
+from monolithicScheme import perform_monolithic_theta_scheme_step
+from periodicSteadyState import PeriodicSteadyStateDetector
+from output import writeOutputToVTK, VTUWriter, TimeSeriesWriter, readTimeSeries
+from tubeParameters import a0, frequency, p0, E, L, N, dx, velocity_in
+
+
+parser = argparse.ArgumentParser(description="Solves the fluid of FluidSolver.py and the tube law of SolidSolver.py \
+                                              monolithically with one Newton iteration per time step, without \
+                                              preCICE. Serves as reference for the partitioned simulation.")
+parser.add_argument("--time-window-size", help="Time step size, see precice-config.xml.", type=float, default=.01)
+parser.add_argument("--max-time", help="End time, see precice-config.xml.", type=float, default=1.)
+parser.add_argument("--theta", help="Theta of the time integration, FluidSolver.py uses implicit Euler.", type=float,
+                    default=1)
+parser.add_argument("--output-format", help="Format of the output files 'output/out_monolithic_*', see FluidSolver.py.",
+                    choices=['off', 'vtk', 'vtu', 'npz'], default='vtu')
+parser.add_argument("--reference", help="Time series file of a partitioned run written with '--output-format npz'. \
+                    The deviation of the partitioned from the monolithic solution is reported.", type=str)
+parser.add_argument("--periodic-steady-state", help="Tolerance for detecting a periodic steady state by comparing the \
+                    solution with the solution one inflow period earlier. The simulation ends once the solution is \
+                    periodic, the output of the last period represents the periodic solution.", type=float)
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+
+    output_mode = config.OutputModes[args.output_format.upper()]
+    x = np.linspace(0, L, N + 1)
+    datanames = ["velocity", "pressure", "diameter"]
+    if output_mode is config.OutputModes.VTU:
+        outputWriter = VTUWriter("out_monolithic_", x)
+    elif output_mode is config.OutputModes.NPZ:
+        outputWriter = TimeSeriesWriter("out_monolithic_", x, datanames)
+
+    # same initial state as the partitioned simulation
+    crossSectionLength_old = a0 * np.ones(N + 1)
+    pressure_old = p0 * np.ones(N + 1)
+    velocity_old = velocity_in(0) * crossSectionLength_old[0] * np.ones(N + 1) / crossSectionLength_old
+
+    tau = args.time_window_size
+    n_steps = int(round(args.max_time / tau))
+    iterations = []
+    solution = []
+    if args.periodic_steady_state:
+        period = 2 / frequency  # period of velocity_in
+        detector = PeriodicSteadyStateDetector(int(round(period / tau)), args.periodic_steady_state)
+
+    print("Starting Monolithic Solver...")
+    tic = time.perf_counter()
+    t = 0
+    for time_it in range(n_steps):
+        velocity, pressure, crossSectionLength, success, k = perform_monolithic_theta_scheme_step(
+            velocity_old, pressure_old, crossSectionLength_old, dx, tau, velocity_in(t + tau), a0 * np.ones(N + 1),
+            p0 * np.ones(N + 1), theta=args.theta, E=E)
+        if not success:
+            print("Monolithic solver failed at t = {}".format(t))
+            break
+        t += tau
+        iterations.append(k)
+        velocity_old, pressure_old, crossSectionLength_old = velocity, pressure, crossSectionLength
+        solution.append((velocity, pressure, crossSectionLength))
+
+        if output_mode is config.OutputModes.VTK:
+            writeOutputToVTK(time_it, "out_monolithic_", dx, datanames=datanames, data=solution[-1])
+        elif output_mode in [config.OutputModes.VTU, config.OutputModes.NPZ]:
+            outputWriter.write(time_it, t, datanames=datanames, data=solution[-1])
+
+        if args.periodic_steady_state and detector.update(*solution[-1]):
+            print("Periodic steady state reached at t = {}, periodic residual: {:e}".format(t, detector.residual))
+            break
+    wall_time = time.perf_counter() - tic
+
+    if output_mode in [config.OutputModes.VTU, config.OutputModes.NPZ]:
+        outputWriter.finalize()
+
+    print("Time steps: {}, Newton iterations: {} ({:.2f} per time step)".format(
+        len(iterations), sum(iterations), np.mean(iterations)))
+    print("Wall time: {:.3f} s ({:.4f} s per time step)".format(wall_time, wall_time / len(iterations)))
+
+    if args.reference:
+        reference, _ = readTimeSeries(args.reference)
+        n = min(len(solution), len(reference))
+        for i, dataname in enumerate(datanames):
+            monolithic = np.array([step[i] for step in solution[:n]])
+            deviation = np.max(np.abs(reference[dataname][:n] - monolithic)) / np.max(np.abs(monolithic))
+            print("Maximum relative deviation of the partitioned {}: {:.3e}".format(dataname, deviation))
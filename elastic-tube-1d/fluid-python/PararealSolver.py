@@ -0,0 +1,179 @@
+from __future__ import division, print_function
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import outputConfiguration as config
+from monolithicScheme import perform_monolithic_theta_scheme_step, tube_law
+from output import writeOutputToVTK, VTUWriter, TimeSeriesWriter
+from tubeParameters import a0, p0, E, c_mk, L, N, dx, velocity_in
+
+
+def propagate(state, t, tau, n_steps, theta):
+    """
+    Solves fluid and tube law monolithically for n_steps time steps, see MonolithicSolver.py. The grid is given by the
+    number of nodes of the state, the tube always has the length L.
+
+    :param state: velocity, pressure and cross section at time t
+    :return: states after every time step, array of shape (n_steps, 3, number of nodes)
+    """
+    velocity, pressure, crossSection = state
+    n = pressure.shape[0]
+    states = np.zeros((n_steps, 3, n))
+    for i in range(n_steps):
+        velocity, pressure, crossSection, success, _ = perform_monolithic_theta_scheme_step(
+            velocity, pressure, crossSection, L / (n - 1), tau, velocity_in(t + (i + 1) * tau), a0 * np.ones(n),
+            p0 * np.ones(n), theta=theta, E=E)
+        if not success:
+            raise RuntimeError("Monolithic solver failed at t = {}".format(t + i * tau))
+        states[i] = velocity, pressure, crossSection
+    return states
+
+
+def fine_propagator(state, t, tau, n_steps, theta):
+    """
+    Propagates a state over one time slice on the fine grid and measures the wall time.
+
+    :return: states after every time step, see propagate, and wall time
+    """
+    tic = time.perf_counter()
+    states = propagate(state, t, tau, n_steps, theta)
+    return states, time.perf_counter() - tic
+
+
+def coarse_propagator(state, t, slice_length, N_coarse, n_steps):
+    """
+    Propagates a state of the fine grid over one time slice with implicit Euler on a coarser grid and with larger time
+    steps. The state is interpolated linearly between the grids.
+
+    :return: state at the end of the time slice on the fine grid
+    """
+    x = np.linspace(0, L, state.shape[1])
+    x_coarse = np.linspace(0, L, N_coarse + 1)
+    state_coarse = [np.interp(x_coarse, x, field) for field in state]
+    state_coarse = propagate(state_coarse, t, slice_length / n_steps, n_steps, theta=1)[-1]
+    return np.array([np.interp(x, x_coarse, field) for field in state_coarse])
+
+
+parser = argparse.ArgumentParser(description="Solves the fluid of FluidSolver.py and the tube law of SolidSolver.py \
+                                              monolithically like MonolithicSolver.py, but parallel in time with the \
+                                              parareal method. The time interval is split into slices, which are \
+                                              propagated concurrently by a process pool. A coarse propagator connects \
+                                              the slices and the slices are iterated until the states at the slice \
+                                              boundaries do not change anymore.")
+parser.add_argument("--time-window-size", help="Time step size of the fine propagator, see precice-config.xml.",
+                    type=float, default=.01)
+parser.add_argument("--max-time", help="End time, see precice-config.xml.", type=float, default=1.)
+parser.add_argument("--theta", help="Theta of the fine propagator, FluidSolver.py uses implicit Euler.", type=float,
+                    default=1)
+parser.add_argument("--slices", help="Number of time slices, default: number of processes.", type=int)
+parser.add_argument("--processes", help="Number of processes propagating the time slices, default: all cores.",
+                    type=int)
+parser.add_argument("--coarse-N", help="Number of cells of the coarse propagator. Coarser grids than the fine grid \
+                    make the iteration stall at relative changes of about 1e-3, since parareal is not stable for wave \
+                    propagation with spatial coarsening.", type=int, default=N)
+parser.add_argument("--coarse-steps", help="Number of implicit Euler steps of the coarse propagator per time slice.",
+                    type=int, default=1)
+parser.add_argument("--tolerance", help="Tolerance for the relative change of the states at the slice boundaries \
+                    between two parareal iterations.", type=float, default=1e-6)
+parser.add_argument("--output-format", help="Format of the output files 'output/out_parareal_*', see FluidSolver.py.",
+                    choices=['off', 'vtk', 'vtu', 'npz'], default='off')
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+
+    processes = args.processes or os.cpu_count()
+    slices = args.slices or processes
+    tau = args.time_window_size
+    n_steps = int(round(args.max_time / tau))
+    if n_steps % slices != 0:
+        print("The number of time steps ({}) has to be a multiple of the number of slices ({}).".format(
+            n_steps, slices))
+        quit()
+    slice_steps = n_steps // slices
+    slice_length = slice_steps * tau
+
+    # same initial state as the partitioned simulation
+    crossSection = a0 * np.ones(N + 1)
+    initial_state = np.array([velocity_in(0) * np.ones(N + 1), p0 * np.ones(N + 1), crossSection])
+
+    print("Serial reference...")
+    tic = time.perf_counter()
+    reference = propagate(initial_state, 0, tau, n_steps, args.theta)
+    serial_time = time.perf_counter() - tic
+
+    print("Parareal with {} slices of {} time steps on {} processes...".format(slices, slice_steps, processes))
+    with ProcessPoolExecutor(processes) as executor:
+        executor.submit(np.zeros, 1).result()  # start the workers before measuring
+
+        tic = time.perf_counter()
+        coarse_time = 0
+        fine_time = 0  # wall time of the fine propagation, if every slice had its own process
+        # states at the slice boundaries and coarse predictions of the previous iteration
+        boundary = [initial_state] + [None] * slices
+        coarse = [None] * slices
+        fine = [None] * slices
+        tic_coarse = time.perf_counter()
+        for n in range(slices):
+            coarse[n] = coarse_propagator(boundary[n], n * slice_length, slice_length, args.coarse_N,
+                                          args.coarse_steps)
+            boundary[n + 1] = coarse[n]
+        coarse_time += time.perf_counter() - tic_coarse
+
+        iterations = 0
+        change = np.inf
+        while iterations < slices and change >= args.tolerance:
+            # after k iterations, the first k slices are exact and do not need to be propagated again
+            futures = {n: executor.submit(fine_propagator, boundary[n], n * slice_length, tau, slice_steps, args.theta)
+                       for n in range(iterations, slices)}
+            slice_times = []
+            for n, future in futures.items():
+                fine[n], slice_time = future.result()
+                slice_times.append(slice_time)
+            fine_time += max(slice_times)
+            iterations += 1
+
+            # sequential correction with the coarse propagator
+            change = 0
+            tic_coarse = time.perf_counter()
+            boundary[iterations] = fine[iterations - 1][-1]
+            for n in range(iterations, slices):
+                coarse_new = coarse_propagator(boundary[n], n * slice_length, slice_length, args.coarse_N,
+                                               args.coarse_steps)
+                state = coarse_new + fine[n][-1] - coarse[n]
+                state[2] = tube_law(state[1], a0, p0, c_mk)  # keep the cross section consistent with the pressure
+                change = max(change, max(np.linalg.norm(field - field_old) / np.linalg.norm(field)
+                                         for field, field_old in zip(state, boundary[n + 1])))
+                boundary[n + 1] = state
+                coarse[n] = coarse_new
+            coarse_time += time.perf_counter() - tic_coarse
+            print("Parareal iteration {}: maximum relative change at the slice boundaries {:e}".format(
+                iterations, change))
+        parareal_time = time.perf_counter() - tic
+
+    # the last fine propagation started from the converged slice boundaries
+    solution = np.concatenate(fine)
+    print("Parareal iterations: {} (at most {})".format(iterations, slices))
+    print("Serial wall time: {:.3f} s, parareal wall time: {:.3f} s, speedup: {:.2f}".format(
+        serial_time, parareal_time, serial_time / parareal_time))
+    print("Coarse propagator: {:.3f} s, fine propagator: {:.3f} s with one process per slice, speedup with one process "
+          "per slice: {:.2f}".format(coarse_time, fine_time, serial_time / (coarse_time + fine_time)))
+    for i, dataname in enumerate(["velocity", "pressure", "diameter"]):
+        deviation = np.max(np.abs(solution[:, i] - reference[:, i])) / np.max(np.abs(reference[:, i]))
+        print("Maximum relative deviation of the parareal {} from the serial run: {:.3e}".format(dataname, deviation))
+
+    output_mode = config.OutputModes[args.output_format.upper()]
+    x = np.linspace(0, L, N + 1)
+    datanames = ["velocity", "pressure", "diameter"]
+    if output_mode is config.OutputModes.VTU:
+        outputWriter = VTUWriter("out_parareal_", x)
+    elif output_mode is config.OutputModes.NPZ:
+        outputWriter = TimeSeriesWriter("out_parareal_", x, datanames)
+    for time_it, state in enumerate(solution):
+        if output_mode is config.OutputModes.VTK:
+            writeOutputToVTK(time_it, "out_parareal_", dx, datanames=datanames, data=state)
+        elif output_mode in [config.OutputModes.VTU, config.OutputModes.NPZ]:
+            outputWriter.write(time_it, (time_it + 1) * tau, datanames=datanames, data=state)
+    if output_mode in [config.OutputModes.VTU, config.OutputModes.NPZ]:
+        outputWriter.finalize()
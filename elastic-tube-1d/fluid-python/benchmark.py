@@ -0,0 +1,141 @@
+from __future__ import division, print_function
+import argparse
+import csv
+import itertools
+import resource
+import sys
+import time
+import tracemalloc
+import numpy as np
+from thetaScheme import perform_partitioned_theta_scheme_step, NonlinearSolverModes, NonlinearSolverState
+from monolithicScheme import tube_law
+from tubeParameters import a0, ampl, frequency, p0, c_mk, L, velocity_in
+
+fields = ["N", "theta", "tau", "mode", "time_per_step", "iterations_per_step", "peak_memory", "factor_memory",
+          "max_rss"]
+
+
+def synthetic_pressure(x, t):
+    """
+    Pressure wave travelling through the tube, used to create the cross section input of the fluid without a solid
+    participant.
+    """
+    return 100 * ampl * np.sin(2 * np.pi * (x / L - frequency * t / 2))
+
+
+def run_case(N, theta, tau, mode, steps):
+    """
+    Performs steps of the theta scheme with N cells and returns time and Newton iterations per step, the peak memory
+    allocated through Python (including NumPy arrays) during the first step, the memory of the factorized Jacobian and
+    the maximum resident set size of the process. The resident set size also covers memory allocated outside of Python,
+    but it never decreases, i.e. it is the maximum over all cases run so far.
+    """
+    x = np.linspace(0, L, N + 1)
+    dx = L / N
+    crossSection0 = tube_law(synthetic_pressure(x, 0), a0, p0, c_mk)
+    velocity0 = velocity_in(0) * crossSection0[0] / crossSection0
+    pressure0 = p0 * np.ones(N + 1)
+    solver_state = NonlinearSolverState(mode)
+
+    times = []
+    iterations = []
+    peak_memory = 0
+    t = 0
+    for step in range(steps):
+        crossSection1 = tube_law(synthetic_pressure(x, t + tau), a0, p0, c_mk)
+        # every step is a new time window, like in FluidSolver.py the factorization is not reused across windows
+        solver_state.start_window()
+        # memory tracing slows down the solver, therefore the first step is only used to measure memory
+        if step == 0:
+            tracemalloc.start()
+        tic = time.perf_counter()
+        velocity1, pressure1, success = perform_partitioned_theta_scheme_step(
+            velocity0, pressure0, crossSection0, crossSection1, dx, tau, velocity_in(t + tau), custom_coupling=True,
+            theta=theta, solver_state=solver_state)
+        if step == 0:
+            peak_memory = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        if step > 0 or steps == 1:
+            times.append(time.perf_counter() - tic)
+        iterations.append(solver_state.statistics.iterations)
+        if not success:
+            print("Nonlinear solver failed for N = {}, theta = {}, tau = {}".format(N, theta, tau))
+            break
+        velocity0, pressure0, crossSection0 = velocity1, pressure1, crossSection1
+        t += tau
+
+    return {"N": N, "theta": theta, "tau": tau, "mode": mode.name,
+            "time_per_step": np.median(times),
+            "iterations_per_step": np.mean(iterations),
+            "peak_memory": peak_memory,
+            "factor_memory": solver_state.lu.factors.nbytes if solver_state.lu is not None else 0,
+            "max_rss": max_rss()}
+
+
+def max_rss():
+    """
+    :return: maximum resident set size of the process in bytes
+    """
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == "darwin" else 1024 * rss  # kilobytes on Linux
+
+
+def read_results(filename):
+    with open(filename) as f:
+        return {(int(row["N"]), float(row["theta"]), float(row["tau"]), row["mode"]): row for row in csv.DictReader(f)}
+
+
+def write_results(filename, results):
+    with open(filename, 'w') as f:
+        writer = csv.DictWriter(f, fieldnames=fields)
+        writer.writeheader()
+        writer.writerows(results)
+
+
+parser = argparse.ArgumentParser(description="Benchmark of the theta scheme of the 1D elastic tube fluid without "
+                                             "preCICE. The cross section is prescribed by the tube law of the solid "
+                                             "for a synthetic pressure wave.")
+parser.add_argument("--N", help="Numbers of cells.", nargs='+', type=int, default=[100, 1000, 10000, 100000])
+parser.add_argument("--theta", help="Values of theta.", nargs='+', type=float, default=[1, .5])
+parser.add_argument("--tau", help="Timestep sizes.", nargs='+', type=float, default=[.01, .001])
+parser.add_argument("--nonlinear-solver", help="Nonlinear solver modes.", nargs='+',
+                    choices=['newton', 'chord'], default=['newton'])
+parser.add_argument("--steps", help="Number of timesteps per case.", type=int, default=5)
+parser.add_argument("--output", help="CSV file the results are written to.", type=str,
+                    default="output/benchmark.csv")
+parser.add_argument("--baseline", help="CSV file of an earlier run. Cases that became slower by more than the given \
+                    tolerance are reported and the script exits with an error.", type=str)
+parser.add_argument("--tolerance", help="Allowed relative slowdown compared to the baseline.", type=float, default=.2)
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+
+    results = []
+    print("{:>8} {:>6} {:>8} {:>8} {:>14} {:>12} {:>12} {:>12} {:>12}".format(
+        "N", "theta", "tau", "mode", "time/step [s]", "iterations", "memory [MB]", "factor [MB]", "RSS [MB]"))
+    for N, theta, tau, mode in itertools.product(args.N, args.theta, args.tau, args.nonlinear_solver):
+        result = run_case(N, theta, tau, NonlinearSolverModes[mode.upper()], args.steps)
+        print("{N:>8} {theta:>6} {tau:>8} {mode:>8} {time_per_step:>14.6f} {iterations_per_step:>12.2f} "
+              "{memory:>12.2f} {factor:>12.2f} {rss:>12.2f}".format(
+                  memory=result["peak_memory"] / 1e6, factor=result["factor_memory"] / 1e6,
+                  rss=result["max_rss"] / 1e6, **result))
+        results.append(result)
+
+    write_results(args.output, results)
+    print("Results written to {}".format(args.output))
+
+    if args.baseline:
+        baseline = read_results(args.baseline)
+        regressions = 0
+        for result in results:
+            key = (result["N"], result["theta"], result["tau"], result["mode"])
+            if key not in baseline:
+                continue
+            reference = float(baseline[key]["time_per_step"])
+            if result["time_per_step"] > (1 + args.tolerance) * reference:
+                print("Regression for N = {}, theta = {}, tau = {}, mode = {}: {:.6f} s instead of {:.6f} s".format(
+                    *key, result["time_per_step"], reference))
+                regressions += 1
+        if regressions:
+            raise SystemExit(1)
+        print("No regressions compared to {}".format(args.baseline))
@@ -0,0 +1,71 @@
+from __future__ import division, print_function
+import argparse
+import itertools
+import numpy as np
+from thetaScheme import compute_residual, _compute_residual_loop, create_grid, assemble_jacobian, \
+    assemble_banded_jacobian, BandedLU
+from monolithicScheme import tube_law
+from tubeParameters import a0, p0, c_mk, L, N, velocity_in
+
+parser = argparse.ArgumentParser(description="Checks that the vectorized residual of thetaScheme.py is bit-identical \
+                                              to the node-by-node reference implementation and that the Jacobian \
+                                              assembled in band storage is bit-identical to the sparse Jacobian for \
+                                              perturbed states of the tube.")
+parser.add_argument("--N", help="Number of cells.", type=int, default=N)
+parser.add_argument("--samples", help="Number of random states per case.", type=int, default=10)
+parser.add_argument("--seed", help="Seed of the random perturbations.", type=int, default=0)
+
+
+def band_storage(system, N):
+    """
+    Copies a sparse Jacobian from assemble_jacobian into the node-by-node band storage of BandedLU.
+    """
+    n = system.shape[0]
+    k = BandedLU.bandwidth
+    position = np.empty(n, dtype=int)
+    position[np.arange(n).reshape(-1, 2, N + 1).transpose(0, 2, 1).ravel()] = np.arange(n)
+    system = system.tocoo()
+    rows, cols = position[system.row], position[system.col]
+    band = np.zeros((3 * k + 1, n))
+    band[2 * k + rows - cols, cols] = system.data
+    return band
+
+
+def describe(deviation):
+    return "identical" if deviation == 0 else "differs by {:e}".format(deviation)
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    N = args.N
+    rng = np.random.default_rng(args.seed)
+    tau = .01
+
+    failures = 0
+    for theta, custom_coupling, stretching in itertools.product([1, .5], [True, False], [0, 2]):
+        dx = L / N if stretching == 0 else np.diff(create_grid(N, L, stretching))
+        deviation = 0
+        deviation_jacobian = 0
+        for _ in range(args.samples):
+            pressure0, pressure1 = 100 * rng.standard_normal((2, N + 1))
+            velocity0, velocity1 = velocity_in(0) + rng.standard_normal((2, N + 1))
+            crossSection0, crossSection1 = tube_law(pressure0, a0, p0, c_mk), tube_law(pressure1, a0, p0, c_mk)
+            crossSection_couple = [crossSection0, crossSection1] if custom_coupling else [crossSection1, crossSection1]
+            arguments = (velocity0, pressure0, crossSection0, crossSection1, crossSection_couple, velocity1, pressure1,
+                         dx, tau, velocity_in(tau), theta, 0, c_mk)
+            res = compute_residual(*arguments)
+            res_loop = _compute_residual_loop(*arguments)
+            if not np.array_equal(res, res_loop):
+                deviation = max(deviation, np.max(np.abs(res - res_loop)))
+
+            arguments = (velocity0, pressure0, crossSection1, crossSection_couple, velocity1, dx, tau, theta, 0, c_mk)
+            band = assemble_banded_jacobian(*arguments)
+            expected = band_storage(assemble_jacobian(*arguments), N)
+            if not np.array_equal(band, expected):
+                deviation_jacobian = max(deviation_jacobian, np.max(np.abs(band - expected)))
+        print("theta = {}, custom coupling = {}, stretching = {}: residual {}, Jacobian {}".format(
+            theta, custom_coupling, stretching, describe(deviation), describe(deviation_jacobian)))
+        failures += deviation != 0 or deviation_jacobian != 0
+
+    if failures:
+        raise SystemExit(1)
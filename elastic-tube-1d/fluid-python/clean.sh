@@ -3,5 +3,5 @@ set -e -u
 
 . ../../tools/cleaning-tools.sh
 
-rm -rvf ./output/*.vtk
+rm -rvf ./output/*.vtk ./output/*.vtu ./output/*.pvd ./output/*.npy ./output/*.npz ./output/*.mp4 ./output/*.gif ./output/*.prof ./output/*.jsonl ./output/*.csv
 clean_precice_logs .
@@ -0,0 +1,59 @@
+from __future__ import division, print_function
+import argparse
+import itertools
+import time
+import numpy as np
+from monolithicScheme import perform_monolithic_theta_scheme_step
+from thetaScheme import create_grid
+from tubeParameters import a0, p0, E, L, velocity_in
+
+
+def run_case(N, stretching, tau, steps):
+    """
+    Solves fluid and tube law monolithically, see MonolithicSolver.py, on the grid create_grid(N, L, stretching).
+
+    :return: nodes, cross section of all time steps of shape (steps, N+1) and wall time per time step
+    """
+    x = create_grid(N, L, stretching)
+    dx = np.diff(x) if stretching != 0 else L / N
+    crossSection = a0 * np.ones(N + 1)
+    pressure = p0 * np.ones(N + 1)
+    velocity = velocity_in(0) * np.ones(N + 1)
+
+    crossSections = np.zeros((steps, N + 1))
+    tic = time.perf_counter()
+    for step in range(steps):
+        velocity, pressure, crossSection, success, _ = perform_monolithic_theta_scheme_step(
+            velocity, pressure, crossSection, dx, tau, velocity_in((step + 1) * tau), a0 * np.ones(N + 1),
+            p0 * np.ones(N + 1), E=E)
+        if not success:
+            raise RuntimeError("Monolithic solver failed for N = {}, stretching = {}".format(N, stretching))
+        crossSections[step] = crossSection
+    return x, crossSections, (time.perf_counter() - tic) / steps
+
+
+parser = argparse.ArgumentParser(description="Compares the spatial convergence and the cost of uniform and stretched \
+                                              grids, see FluidSolver.py --grid-stretching. The errors of the cross \
+                                              section are measured against a uniform reference solution on a fine \
+                                              grid with the same time step size.")
+parser.add_argument("--N", help="Numbers of cells.", nargs='+', type=int, default=[25, 50, 100, 200, 400])
+parser.add_argument("--stretching", help="Grid stretchings, 0 is the uniform grid.", nargs='+', type=float,
+                    default=[0, 1, 2])
+parser.add_argument("--reference-N", help="Number of cells of the reference solution.", type=int, default=3200)
+parser.add_argument("--time-window-size", help="Time step size, see precice-config.xml.", type=float, default=.01)
+parser.add_argument("--max-time", help="End time, see precice-config.xml.", type=float, default=1.)
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    steps = int(round(args.max_time / args.time_window_size))
+
+    x_reference, reference, _ = run_case(args.reference_N, 0, args.time_window_size, steps)
+
+    print("{:>8} {:>12} {:>16} {:>16} {:>16}".format("N", "stretching", "max error", "error at inlet",
+                                                     "time/step [s]"))
+    for N, stretching in itertools.product(args.N, args.stretching):
+        x, crossSections, time_per_step = run_case(N, stretching, args.time_window_size, steps)
+        error = np.abs(crossSections - np.array([np.interp(x, x_reference, values) for values in reference]))
+        inlet = x < L / 10  # first tenth of the tube
+        print("{:>8} {:>12} {:>16.3e} {:>16.3e} {:>16.6f}".format(
+            N, stretching, np.max(error), np.max(error[:, inlet]), time_per_step))
@@ -0,0 +1,139 @@
+# Monolithic variant of the theta scheme in thetaScheme.py. The cross section is not an input of the fluid anymore, but
+# given by the tube law of the solid (see SolidSolver.py) as a function of the pressure. Fluid and solid are therefore
+# solved together with a single Newton iteration per time step and no coupling iterations are needed.
+
+from __future__ import division, print_function
+import numpy as np
+import scipy.sparse as sp
+from scipy.sparse.linalg import splu
+from thetaScheme import compute_residual, assemble_jacobian, grid_spacing
+
+
+def tube_law(pressure, crossSection_ref, pressure_ref, c_mk):
+    """
+    Cross section of the tube for a given pressure, see SolidSolver.py
+
+    :param crossSection_ref: cross section at the reference pressure pressure_ref
+    """
+    return crossSection_ref * ((pressure_ref - 2.0 * c_mk ** 2) ** 2 / (pressure - 2.0 * c_mk ** 2) ** 2)
+
+
+def tube_law_derivative(pressure, crossSection_ref, pressure_ref, c_mk):
+    """
+    Derivative of tube_law with respect to the pressure
+    """
+    return -2.0 * crossSection_ref * ((pressure_ref - 2.0 * c_mk ** 2) ** 2 / (pressure - 2.0 * c_mk ** 2) ** 3)
+
+
+def assemble_cross_section_jacobian(velocity1, pressure1, dx, tau, theta):
+    """
+    Assembles the derivative of compute_residual with respect to the cross section at the new time, if the same cross
+    section is used in the time derivative and in the coupling terms (crossSection1 = crossSection_couple[1]). The
+    residual is linear in this cross section and every interior row couples to the nodes i-1, i, i+1.
+
+    :return: derivative of size (2N+2)x(N+1) as scipy.sparse.csc_matrix
+    """
+    N = pressure1.shape[0] - 1
+    dx = grid_spacing(dx, N)[0]
+
+    # shifted views for the interior nodes i = 1, ..., N-1
+    im, ic, ip = slice(0, N - 1), slice(1, N), slice(2, N + 1)
+    i = np.arange(1, N)
+
+    u1m, u1c, u1p = velocity1[im], velocity1[ic], velocity1[ip]
+    p1m, p1c, p1p = pressure1[im], pressure1[ic], pressure1[ip]
+
+    rows = []
+    cols = []
+    vals = []
+
+    def add(row, col, val):
+        rows.append(row)
+        cols.append(col)
+        vals.append(val)
+
+    # Momentum
+    add(i, i - 1, .25 * theta * (+ u1m * u1c + u1m * u1m + p1m - p1c))
+    add(i, i, - u1c * dx / tau
+        + .25 * theta * (- u1c * u1p - u1c * u1c + u1m * u1c + u1m * u1m + p1m - p1p))
+    add(i, i + 1, .25 * theta * (- u1c * u1p - u1c * u1c + p1c - p1p))
+
+    # Continuity
+    add(i + N + 1, i - 1, .25 * theta * (+ u1m + u1c))
+    add(i + N + 1, i, - dx / tau + .25 * theta * (+ u1m - u1p))
+    add(i + N + 1, i + 1, .25 * theta * (- u1c - u1p))
+
+    # the boundary conditions do not depend on the cross section
+    return sp.csc_matrix((np.concatenate(vals), (np.concatenate(rows), np.concatenate(cols))),
+                         shape=(2 * N + 2, N + 1))
+
+
+def perform_monolithic_theta_scheme_step(velocity0, pressure0, crossSection0, dx, tau, velocity_in, crossSection_ref,
+                                         pressure_ref, theta=1, E=10000):
+    """
+    Performs one step of the theta scheme for the coupled fluid and solid. The cross section at the new time is
+    crossSection1 = tube_law(pressure1), the old cross section crossSection0 is used in the coupling terms of the old
+    time like in perform_partitioned_theta_scheme_step with custom_coupling = True.
+
+    :param crossSection_ref: cross section of the tube at the reference pressure pressure_ref, see SolidSolver.py
+    :return: velocity1, pressure1, crossSection1, success, Newton iterations
+    """
+    k = 0
+
+    # initial guess for Newtons method
+    pressure1 = np.copy(pressure0)
+    velocity1 = np.copy(velocity0)
+
+    N = pressure0.shape[0] - 1
+
+    alpha = 0
+    success = True
+
+    c_mk = np.sqrt(E / 2 * np.sqrt(np.pi))  # wave speed
+
+    while success:  # perform Newton iterations to solve nonlinear system of equations
+
+        crossSection1 = tube_law(pressure1, crossSection_ref, pressure_ref, c_mk)
+        crossSection_couple = [crossSection0, crossSection1]
+
+        res = compute_residual(velocity0, pressure0, crossSection0, crossSection1, crossSection_couple, velocity1,
+                               pressure1, dx, tau, velocity_in, theta, alpha, c_mk)
+
+        k += 1  # Iteration Count
+
+        # compute relative norm of residual
+        norm_1 = np.sqrt(res.dot(res))
+        norm_2 = np.sqrt(pressure1.dot(pressure1) + velocity1.dot(velocity1))
+        norm = norm_1 / norm_2
+
+        if norm < 1e-10 and k > 1:
+            break  # Nonlinear Solver success
+        elif k > 1000:
+            print(
+                "Nonlinear Solver break, iterations: %i, residual norm: %e\n" % (k, norm))
+            velocity1[:] = np.nan
+            pressure1[:] = np.nan
+            success = False
+            break
+
+        # compute Jacobian for Newton's method: the fluid Jacobian is extended by the dependency of the cross section on
+        # the pressure, the system is the negative derivative of the residual
+        system = assemble_jacobian(velocity0, pressure0, crossSection1, crossSection_couple, velocity1, dx, tau, theta,
+                                   alpha, c_mk)
+        system = system - sp.hstack([sp.csc_matrix((2 * N + 2, N + 1)),
+                                     assemble_cross_section_jacobian(velocity1, pressure1, dx, tau, theta) @ sp.diags(
+                                         tube_law_derivative(pressure1, crossSection_ref, pressure_ref, c_mk))])
+
+        try:
+            solution = splu(sp.csc_matrix(system)).solve(res)
+        except RuntimeError:  # raised by SuperLU if the factor is exactly singular
+            print("LINALGERROR! SINGULAR MATRIX")
+            velocity1[:] = np.nan
+            pressure1[:] = np.nan
+            success = False
+            break
+
+        velocity1 += solution[:N + 1]
+        pressure1 += solution[N + 1:]
+
+    return velocity1, pressure1, tube_law(pressure1, crossSection_ref, pressure_ref, c_mk), success, k - 1
@@ -1,4 +1,11 @@
 import os
+import json
+import queue
+import threading
+import struct
+import zipfile
+import zlib
+import numpy as np
 
 
 def writeOutputToVTK(time, name, dx, data, datanames):
@@ -41,8 +48,13 @@ def writeOutputToVTK(time, name, dx, data, datanames):
     f.write("\n")
     f.write("\n")
 
+    if np.ndim(dx) == 0:
+        x = np.arange(len(data[i])) * dx
+    else:  # cell lengths of a non-uniform grid
+        x = np.concatenate([[0.], np.cumsum(dx)])
+
     for k in range(len(data[i])):
-        f.write(str("{:.16e}".format(0.0 + k * dx)))
+        f.write(str("{:.16e}".format(0.0 + x[k])))
         f.write(" 0.0000000000000000e+00 0.0000000000000000e+00")
         f.write("\n")
     f.write("\n")
@@ -74,3 +86,342 @@ def writeOutputToVTK(time, name, dx, data, datanames):
         f.write("\n")
         i = i + 1
     f.close()
+
+
+class VTUWriter(object):
+    """
+    Writes a time series of the nodal data of the tube as binary XML VTK files (.vtu) with appended raw data, optionally
+    zlib compressed, and a ParaView collection file (.pvd) that lists all written files with their time. The collection
+    file is written once by finalize.
+
+    The point coordinates and the cells (lines between neighbouring nodes) do not change over time and are therefore
+    encoded only once.
+    """
+
+    def __init__(self, name, x, compress=True):
+        """
+        :param name: prefix of the files, the files are called ./output/<name><time index>.vtu and ./output/<name>.pvd
+        :param x: coordinates of the nodes along the tube
+        :param compress: compress the data with zlib
+        """
+        self.name = name
+        self.compress = compress
+        self.outpath = os.path.join(os.getcwd(), './output')
+        self.collection = []
+
+        if not os.path.exists(self.outpath):
+            os.mkdir(self.outpath)
+
+        n_points = x.shape[0]
+        points = np.zeros([n_points, 3])
+        points[:, 0] = x
+        connectivity = np.repeat(np.arange(n_points, dtype='<i8'), 2)[1:-1]
+        offsets = 2 * np.arange(1, n_points, dtype='<i8')
+        types = 3 * np.ones(n_points - 1, dtype=np.uint8)  # VTK_LINE
+
+        self.n_points = n_points
+        self.static_blocks = [self._encode(points), self._encode(connectivity), self._encode(offsets),
+                              self._encode(types)]
+
+    def _encode(self, array):
+        """
+        Encodes an array as block of appended raw data: UInt64 header followed by the (compressed) bytes.
+        """
+        raw = np.ascontiguousarray(array).tobytes()
+        if self.compress:
+            compressed = zlib.compress(raw)
+            # header: number of blocks, block size, size of last block, compressed size of each block
+            return struct.pack('<4Q', 1, len(raw), len(raw), len(compressed)) + compressed
+        return struct.pack('<Q', len(raw)) + raw
+
+    def write(self, time_index, time, data, datanames):
+        """
+        Writes the nodal data of one time step. The first dataset is written as vector, all others as scalars.
+        """
+        assert len(data) == len(datanames)
+
+        blocks = []
+        for i, values in enumerate(data):
+            values = np.asarray(values, dtype='<f8')
+            if i == 0:
+                vector = np.zeros([self.n_points, 3])
+                vector[:, 0] = values
+                values = vector
+            blocks.append(self._encode(values))
+        blocks += self.static_blocks
+
+        offsets = np.concatenate([[0], np.cumsum([len(block) for block in blocks])])
+
+        arrays = []
+        for i, dataname in enumerate(datanames):
+            arrays.append('<DataArray type="Float64" Name="{}" NumberOfComponents="{}" format="appended" '
+                          'offset="{}"/>'.format(dataname, 3 if i == 0 else 1, offsets[i]))
+        k = len(datanames)
+
+        header = "\n".join([
+            '<?xml version="1.0"?>',
+            '<VTKFile type="UnstructuredGrid" version="1.0" byte_order="LittleEndian" header_type="UInt64"{}>'.format(
+                ' compressor="vtkZLibDataCompressor"' if self.compress else ''),
+            '<UnstructuredGrid>',
+            '<Piece NumberOfPoints="{}" NumberOfCells="{}">'.format(self.n_points, self.n_points - 1),
+            '<PointData Vectors="{}" Scalars="{}">'.format(datanames[0], datanames[-1]),
+            "\n".join(arrays),
+            '</PointData>',
+            '<Points>',
+            '<DataArray type="Float64" NumberOfComponents="3" format="appended" offset="{}"/>'.format(offsets[k]),
+            '</Points>',
+            '<Cells>',
+            '<DataArray type="Int64" Name="connectivity" format="appended" offset="{}"/>'.format(offsets[k + 1]),
+            '<DataArray type="Int64" Name="offsets" format="appended" offset="{}"/>'.format(offsets[k + 2]),
+            '<DataArray type="UInt8" Name="types" format="appended" offset="{}"/>'.format(offsets[k + 3]),
+            '</Cells>',
+            '</Piece>',
+            '</UnstructuredGrid>',
+            '<AppendedData encoding="raw">',
+            '_'])
+        footer = "\n</AppendedData>\n</VTKFile>\n"
+
+        filename = self.name + str(time_index) + ".vtu"
+        with open(os.path.join(self.outpath, filename), 'wb') as f:
+            f.write(header.encode() + b"".join(blocks) + footer.encode())
+
+        self.collection.append((time, filename))
+
+    def finalize(self):
+        """
+        Writes the ParaView collection file of all time steps written so far.
+        """
+        datasets = "\n".join('<DataSet timestep="{:.16e}" group="" part="0" file="{}"/>'.format(time, filename)
+                             for time, filename in self.collection)
+        with open(os.path.join(self.outpath, self.name + ".pvd"), 'w') as f:
+            f.write("\n".join([
+                '<?xml version="1.0"?>',
+                '<VTKFile type="Collection" version="0.1" byte_order="LittleEndian">',
+                '<Collection>',
+                datasets,
+                '</Collection>',
+                '</VTKFile>',
+                '']))
+
+
+class AsynchronousWriter(object):
+    """
+    Calls a write function in a background thread, such that the solver can continue while the output is formatted
+    and written to disk. The arguments are passed to the thread as they are, i.e. the caller hands over ownership and
+    must not modify the arrays afterwards.
+
+    At most max_in_flight snapshots wait for the thread. If the disk is slower than the solver, submit blocks until the
+    thread caught up. For max_in_flight = 0, write is called directly.
+    """
+
+    _stop = object()
+
+    def __init__(self, write, max_in_flight=4):
+        """
+        :param write: function that writes one snapshot
+        :param max_in_flight: maximum number of snapshots waiting to be written
+        """
+        self.write = write
+        self.max_in_flight = max_in_flight
+        self.error = None
+        if max_in_flight > 0:
+            self.queue = queue.Queue(maxsize=max_in_flight)
+            self.thread = threading.Thread(target=self._work, daemon=True)
+            self.thread.start()
+
+    def _work(self):
+        while True:
+            item = self.queue.get()
+            if item is self._stop:
+                break
+            args, kwargs = item
+            if self.error is None:  # skip the remaining snapshots after an error, but keep emptying the queue
+                try:
+                    self.write(*args, **kwargs)
+                except Exception as error:
+                    self.error = error
+
+    def _check(self):
+        if self.error is not None:
+            raise RuntimeError("Writing output failed") from self.error
+
+    def submit(self, *args, **kwargs):
+        """
+        Writes a snapshot asynchronously. Blocks while max_in_flight snapshots are waiting.
+        """
+        self._check()
+        if self.max_in_flight > 0:
+            self.queue.put((args, kwargs))
+        else:
+            self.write(*args, **kwargs)
+
+    def finalize(self):
+        """
+        Waits until all submitted snapshots are written and stops the thread.
+        """
+        if self.max_in_flight > 0:
+            self.queue.put(self._stop)
+            self.thread.join()
+        self._check()
+
+
+class TimeSeriesWriter(object):
+    """
+    Appends the nodal data of all time steps to a single compressed NumPy archive ./output/<name>.npz. The node
+    coordinates are stored once in the member "x". The time steps are buffered and every chunk of chunk_size time steps
+    is appended as a zlib-compressed member "chunk_<k>" holding a one-dimensional structured array with one record per
+    time step. Every record contains the field "time" and one field of shape (N+1,) per dataset. The empty member
+    "fields" has the same fields, such that an archive without time steps, e.g. of a failed run, can be read as well.
+
+    The archive is closed after every chunk, such that it can be opened at any time with readTimeSeries. Reading a range
+    of time steps only decompresses the chunks covering this range.
+    """
+
+    def __init__(self, name, x, datanames, chunk_size=100):
+        """
+        :param name: name of the file without extension
+        :param x: coordinates of the nodes along the tube
+        :param datanames: names of the datasets
+        :param chunk_size: number of time steps written at once
+        """
+        outpath = os.path.join(os.getcwd(), './output')
+
+        if not os.path.exists(outpath):
+            os.mkdir(outpath)
+
+        self.dtype = np.dtype([("time", '<f8')] + [(dataname, '<f8', (x.shape[0],)) for dataname in datanames])
+        self.buffer = np.zeros(chunk_size, dtype=self.dtype)
+        self.buffered = 0
+        self.chunks = 0
+        self.filename = os.path.join(outpath, name + ".npz")
+        with zipfile.ZipFile(self.filename, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+            self._writeMember(archive, "x", np.asarray(x, dtype='<f8'))
+            self._writeMember(archive, "fields", np.zeros(0, dtype=self.dtype))
+
+    @staticmethod
+    def _writeMember(archive, name, array):
+        # same layout as numpy.savez_compressed, such that numpy.load can read the archive
+        with archive.open(name + ".npy", 'w', force_zip64=True) as f:
+            np.lib.format.write_array(f, array)
+
+    def write(self, time_index, time, data, datanames):
+        """
+        Appends the nodal data of one time step. time_index is only accepted for compatibility with VTUWriter.write.
+        """
+        assert list(datanames) == list(self.dtype.names[1:])
+
+        record = self.buffer[self.buffered]
+        record["time"] = time
+        for dataname, values in zip(datanames, data):
+            record[dataname] = values
+        self.buffered += 1
+
+        if self.buffered == self.buffer.shape[0]:
+            self.flush()
+
+    def flush(self):
+        """
+        Appends the buffered time steps to the archive as a new chunk.
+        """
+        if self.buffered == 0:
+            return
+        with zipfile.ZipFile(self.filename, 'a', compression=zipfile.ZIP_DEFLATED) as archive:
+            self._writeMember(archive, "chunk_{:06d}".format(self.chunks), self.buffer[:self.buffered])
+        self.chunks += 1
+        self.buffered = 0
+
+    def finalize(self):
+        self.flush()
+
+
+class TimeSeries(object):
+    """
+    Read access to an archive written by TimeSeriesWriter. series["pressure"] gives the pressure of all time steps as a
+    TimeSeriesDataset, which only decompresses the chunks that are sliced, e.g. series["pressure"][100:200] reads the
+    chunks holding the time steps 100 to 199.
+    """
+
+    def __init__(self, filename):
+        self.archive = np.load(filename)  # the members of the archive are only read on access
+        self.chunk_names = sorted(name for name in self.archive.files if name.startswith("chunk_"))
+        self._cache = (None, None)  # last decompressed chunk, for reading one time step after another
+        self.dtype = self.archive["fields"].dtype
+        if self.chunk_names:
+            first, last = self._chunk(0), self._chunk(len(self.chunk_names) - 1)
+            self.chunk_size = first.shape[0]
+            self.length = self.chunk_size * (len(self.chunk_names) - 1) + last.shape[0]
+        else:
+            self.chunk_size, self.length = 1, 0
+
+    def _chunk(self, k):
+        if self._cache[0] != k:
+            self._cache = (k, self.archive[self.chunk_names[k]])
+        return self._cache[1]
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, dataname):
+        return TimeSeriesDataset(self, dataname)
+
+    def read(self, dataname, start, stop):
+        """
+        :return: dataname of the time steps start, ..., stop - 1
+        """
+        chunks = range(start // self.chunk_size, (stop - 1) // self.chunk_size + 1) if stop > start else []
+        data = [self._chunk(k)[dataname] for k in chunks]
+        if not data:
+            return np.zeros((0,) + self.dtype[dataname].shape)
+        offset = chunks[0] * self.chunk_size
+        return np.concatenate(data)[start - offset:stop - offset]
+
+
+class TimeSeriesDataset(object):
+    """
+    One dataset of a TimeSeries, e.g. the pressure, as array-like of shape (time steps, N+1) that is read on indexing.
+    """
+
+    def __init__(self, series, dataname):
+        self.series = series
+        self.dataname = dataname
+        self.shape = (len(series),) + series.dtype[dataname].shape
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, key):
+        index, rest = (key[0], key[1:]) if isinstance(key, tuple) else (key, ())
+        indices = range(len(self))[index]  # resolves negative indices and slices, checks the bounds
+        if isinstance(indices, range):
+            start = min(indices, default=0)
+            data = self.series.read(self.dataname, start, max(indices, default=-1) + 1)
+            return data[(np.asarray(indices, dtype=int) - start,) + rest]
+        return self.series.read(self.dataname, indices, indices + 1)[(0,) + rest]
+
+    def __array__(self, dtype=None, copy=None):
+        return self[:] if dtype is None else self[:].astype(dtype)
+
+
+def readTimeSeries(filename):
+    """
+    Opens an archive written by TimeSeriesWriter, e.g. readTimeSeries(filename)[0]["pressure"][100:200] reads the
+    pressure of the time steps 100 to 199.
+
+    :return: TimeSeries with the field "time" and one field per dataset, coordinates of the nodes
+    """
+    series = TimeSeries(filename)
+    return series, series.archive["x"]
+
+
+def writeTraceEntry(name, entry):
+    """
+    Appends entry as a single line of JSON to ./output/<name>.jsonl
+    """
+    outpath = os.path.join(os.getcwd(), './output')
+
+    if not os.path.exists(outpath):
+        os.mkdir(outpath)
+
+    with open(os.path.join(outpath, name + ".jsonl"), 'a') as f:
+        f.write(json.dumps(entry))
+        f.write("\n")
@@ -10,4 +10,6 @@ class PlottingModes(Enum):
 
 class OutputModes(Enum):
     OFF = 0  # no plotting over time
-    VTK = 1  # produce VTK output
+    VTK = 1  # produce legacy ASCII VTK output
+    VTU = 2  # produce binary XML VTK output and a ParaView collection file
+    NPZ = 3  # append all time steps to a single compressed NumPy archive
@@ -0,0 +1,45 @@
+from __future__ import division, print_function
+from collections import deque
+import numpy as np
+
+
+class PeriodicSteadyStateDetector(object):
+    """
+    Detects a periodic steady state of a periodically driven simulation by comparing the state after every time window
+    with the state one period earlier. The state is periodic, if the relative difference of all fields stayed below the
+    tolerance for a whole period. Then the stored states of the last period represent the solution for all later times.
+    """
+
+    def __init__(self, period_windows, tolerance):
+        """
+        :param period_windows: number of time windows per period
+        :param tolerance: tolerance for the relative difference of the states one period apart
+        """
+        self.tolerance = tolerance
+        self.history = deque(maxlen=period_windows)  # states of the last period, oldest first
+        self.residuals = deque(maxlen=period_windows)
+        self.residual = np.inf
+
+    def update(self, *state):
+        """
+        Adds the state of a completed time window.
+
+        :param state: fields of the state, e.g. velocity, pressure and cross section
+        :return: True, if the periodic steady state is reached
+        """
+        state = [np.copy(field) for field in state]
+        if len(self.history) == self.history.maxlen:
+            self.residual = max(np.linalg.norm(field - field_old) / max(np.linalg.norm(field), np.finfo(float).tiny)
+                                for field, field_old in zip(state, self.history[0]))
+            self.residuals.append(self.residual)
+        self.history.append(state)
+        return self.is_periodic()
+
+    def is_periodic(self):
+        return len(self.residuals) == self.residuals.maxlen and max(self.residuals) < self.tolerance
+
+    def predict(self):
+        """
+        :return: state of the next time window, i.e. the state one period before it
+        """
+        return [np.copy(field) for field in self.history[0]]
@@ -0,0 +1,131 @@
+from __future__ import division, print_function
+import argparse
+import os
+import subprocess
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import matplotlib
+matplotlib.use("Agg")  # render frames headless
+import matplotlib.pyplot as plt
+import tubePlotting
+from output import readTimeSeries
+
+# properties of the figure, see FluidSolver.py
+figure_size = (6.4, 4.8)
+dpi = 100
+
+
+def read_series(path):
+    """
+    Reads the cross section and velocity of all time windows written by FluidSolver.py, either from a time series file
+    (.npz) or from a series of VTK files given by its prefix, e.g. output/out_fluid_.
+
+    :return: time, cross section and velocity of all time windows, lengths of the cells
+    """
+    if path.endswith(".npz"):
+        series, x = readTimeSeries(path)
+        return series["time"][:], series["diameter"][:], series["velocity"][:], np.diff(x)
+
+    import vtk
+    from vtk.util.numpy_support import vtk_to_numpy
+
+    extension = ".vtu" if os.path.exists(path + "0.vtu") else ".vtk"
+    time, crossSection, velocity = [], [], []
+    while os.path.exists(path + str(len(time)) + extension):
+        if extension == ".vtu":
+            reader = vtk.vtkXMLUnstructuredGridReader()
+        else:
+            reader = vtk.vtkUnstructuredGridReader()
+            reader.ReadAllVectorsOn()
+            reader.ReadAllScalarsOn()
+        reader.SetFileName(path + str(len(time)) + extension)
+        reader.Update()
+        grid = reader.GetOutput()
+        x = vtk_to_numpy(grid.GetPoints().GetData())[:, 0]
+        # VTK files do not store the time, the time windows are numbered instead
+        time.append(len(time))
+        crossSection.append(vtk_to_numpy(grid.GetPointData().GetArray("diameter")))
+        velocity.append(vtk_to_numpy(grid.GetPointData().GetArray("velocity"))[:, 0])
+    if not time:
+        raise IOError("No output found at {}".format(path))
+    return np.array(time), np.array(crossSection), np.array(velocity), np.diff(x)
+
+
+def setup_worker(N, dx):
+    # every worker process draws all of its frames into the same figure
+    global fig, renderer
+    fig, ax = plt.subplots(1, figsize=figure_size, dpi=dpi)
+    renderer = tubePlotting.TubeRenderer(ax, N, dx, blit=False)
+
+
+def render_frame(frame):
+    """
+    Renders a single frame and returns its RGBA pixels.
+    """
+    t, crossSection, velocity = frame
+    renderer.update(crossSection, velocity, None, t)
+    fig.canvas.draw()
+    return bytes(fig.canvas.buffer_rgba())
+
+
+def render_frames(executor, frames, in_flight):
+    """
+    Renders frames in the worker processes and yields them in order. At most in_flight frames are rendered ahead of the
+    encoder, which bounds the memory if encoding is slower than rendering.
+    """
+    pending = deque()
+    for frame in frames:
+        pending.append(executor.submit(render_frame, frame))
+        if len(pending) >= in_flight:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def encode(frames, filename, fps):
+    """
+    Encodes an iterable of RGBA frames in a single pass. GIF files are written with Pillow, all other formats are piped
+    to ffmpeg.
+    """
+    width, height = int(figure_size[0] * dpi), int(figure_size[1] * dpi)
+    if filename.endswith(".gif"):
+        from PIL import Image
+        images = [Image.frombytes("RGBA", (width, height), frame).convert("RGB") for frame in frames]
+        images[0].save(filename, save_all=True, append_images=images[1:], duration=1000 / fps, loop=0)
+        return len(images)
+
+    ffmpeg = subprocess.Popen(["ffmpeg", "-y", "-loglevel", "error", "-f", "rawvideo", "-pix_fmt", "rgba",
+                               "-s", "{}x{}".format(width, height), "-r", str(fps), "-i", "-",
+                               "-pix_fmt", "yuv420p", filename], stdin=subprocess.PIPE)
+    n_frames = 0
+    for frame in frames:
+        ffmpeg.stdin.write(frame)
+        n_frames += 1
+    ffmpeg.stdin.close()
+    if ffmpeg.wait() != 0:
+        raise RuntimeError("ffmpeg failed to encode {}".format(filename))
+    return n_frames
+
+
+parser = argparse.ArgumentParser(description="Renders a video of a finished run of FluidSolver.py from its output. The \
+                                              frames are rendered in parallel without a display.")
+parser.add_argument("output", help="Time series file written with '--output-format npz' or prefix of the VTK files.",
+                    nargs='?', type=str, default="output/out_fluid_")
+parser.add_argument("--video", help="Name of the video file.", type=str, default="output/tube.mp4")
+parser.add_argument("--fps", help="Frames per second.", type=int, default=15)
+parser.add_argument("--processes", help="Number of processes rendering frames, default: all cores.", type=int)
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+
+    time, crossSection, velocity, dx = read_series(args.output)
+    N = crossSection.shape[1]
+    print("Rendering {} frames...".format(time.shape[0]))
+
+    processes = args.processes or os.cpu_count()
+    with ProcessPoolExecutor(processes, initializer=setup_worker, initargs=(N, dx)) as executor:
+        frames = render_frames(executor, zip(time, crossSection, velocity), 4 * processes)
+        n_frames = encode(frames, args.video, args.fps)
+
+    print("{} frames written to {}".format(n_frames, args.video))
@@ -4,17 +4,556 @@
 # [2] Gresho, P. M., & Sani, R. L. (2000). Incompressible Flow and the Finite Element Method, Isothermal Laminar Flow. John Wiley & Sons. Retrieved from http://books.google.de/books?id=m_tQAAAAMAAJ
 
 from __future__ import division, print_function
+from collections import OrderedDict
+from enum import Enum
+import hashlib
+import time
 import numpy as np
+import scipy.sparse as sp
+from scipy.linalg.lapack import dgbtrf, dgbtrs
+
+
+class NonlinearSolverModes(Enum):
+    NEWTON = 0  # assemble and factorize the Jacobian in every Newton iteration
+    CHORD = 1  # reuse the factorized Jacobian as long as the iteration contracts sufficiently
+
+
+class NonlinearSolverStatistics(object):
+    """
+    Statistics of a single call of perform_partitioned_theta_scheme_step: Newton iterations, relative residual norm of
+    every iteration and wall time spent in residual evaluation, Jacobian assembly and factorization and linear solves.
+    """
+
+    def __init__(self):
+        self.iterations = 0
+        self.residuals = []
+        self.time_residual = 0.
+        self.time_jacobian = 0.
+        self.time_solve = 0.
+
+    def as_dict(self):
+        return {"iterations": self.iterations,
+                "residuals": self.residuals,
+                "time_residual": self.time_residual,
+                "time_jacobian": self.time_jacobian,
+                "time_solve": self.time_solve}
+
+
+class NonlinearSolverState(object):
+    """
+    Keeps the factorized Jacobian of perform_partitioned_theta_scheme_step alive between Newton iterations and between
+    the coupling iterations of one time window. Additionally counts Newton iterations and Jacobian factorizations.
+
+    In CHORD mode the Jacobian is only refactorized, if the residual norm decreases by less than max_contraction in
+    one iteration.
+
+    The statistics of the last call of perform_partitioned_theta_scheme_step are stored in statistics. An optional
+    StepCache memoizes the solutions of the current time window.
+    """
+
+    def __init__(self, mode=NonlinearSolverModes.NEWTON, max_contraction=.5, cache=None):
+        self.mode = mode
+        self.cache = cache
+        self.max_contraction = max_contraction
+        self.lu = None
+        self.iterations = 0
+        self.factorizations = 0
+        self.statistics = NonlinearSolverStatistics()
+
+    def start_window(self):
+        """
+        Drops the factorization and the cached solutions and resets the counters. Call at the beginning of each time
+        window.
+        """
+        self.lu = None
+        if self.cache is not None:
+            self.cache.clear()
+        self.iterations = 0
+        self.factorizations = 0
+
+
+class StepCache(object):
+    """
+    Memo cache of perform_partitioned_theta_scheme_step for one time window. In implicit coupling, the fluid may receive
+    a cross section that it already solved for in the same window, e.g. in the last coupling iteration. The inputs are
+    rounded to the relative tolerance before hashing, such that inputs which are equal within round-off share a key.
+    The cache is cleared at the beginning of every time window, see NonlinearSolverState.start_window.
+    """
+
+    def __init__(self, tolerance=1e-12, max_entries=16):
+        """
+        :param tolerance: relative tolerance for considering two inputs equal, 0 only matches identical inputs
+        :param max_entries: number of solutions kept, the oldest solution is dropped first
+        """
+        self.tolerance = tolerance
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, *inputs):
+        """
+        :param inputs: arrays and scalars the solution depends on
+        :return: hash of the inputs rounded to the relative tolerance and of the tolerance itself
+        """
+        digest = hashlib.sha1(repr(self.tolerance).encode())
+        for value in inputs:
+            mantissa, exponent = np.frexp(np.asarray(value, dtype=float))
+            if self.tolerance > 0:
+                mantissa = np.round(mantissa / self.tolerance)
+            digest.update(np.ascontiguousarray(mantissa + 0.).tobytes())  # + 0. turns -0. into 0.
+            digest.update(np.ascontiguousarray(exponent).tobytes())
+        return digest.hexdigest()
+
+    def lookup(self, key):
+        """
+        :return: copies of the cached velocity1 and pressure1 or None, if the key is not cached
+        """
+        if key not in self.entries:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return [np.copy(field) for field in self.entries[key]]
+
+    def store(self, key, velocity1, pressure1):
+        self.entries[key] = (np.copy(velocity1), np.copy(pressure1))
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+
+
+def create_grid(N, L, stretching=0):
+    """
+    Creates the nodes of a tube of length L with N cells. For stretching > 0, the cells grow geometrically from the
+    inlet to the outlet, such that the resolution is concentrated near the inlet.
+
+    :param stretching: the ratio of the last to the first cell length is about exp(stretching), 0 gives a uniform grid
+    :return: coordinates of the N+1 nodes
+    """
+    if stretching == 0:
+        return np.linspace(0, L, N + 1)
+    return L * np.expm1(stretching * np.linspace(0, 1, N + 1)) / np.expm1(stretching)
+
+
+def grid_spacing(dx, N):
+    """
+    Returns the lengths of the control volumes around the interior nodes and the ratios of the cell lengths at the
+    inlet and at the outlet, which are used for the linear extrapolation of the boundary values.
+
+    :param dx: cell length of a uniform grid (also per tube for a batch) or array of the N cell lengths
+    x[i+1] - x[i] of a non-uniform grid, e.g. np.diff(create_grid(N, L, stretching))
+    :return: control volume lengths of the interior nodes, h[0] / h[1] and h[-1] / h[-2]
+    """
+    if np.ndim(dx) == 0 or np.shape(dx)[-1] != N:
+        return dx, 1., 1.
+    dx = np.asarray(dx)
+    return .5 * (dx[..., :-1] + dx[..., 1:]), dx[..., 0] / dx[..., 1], dx[..., -1] / dx[..., -2]
+
+
+def compute_residual(velocity0, pressure0, crossSection0, crossSection1, crossSection_couple, velocity1, pressure1,
+                     dx, tau, velocity_in, theta, alpha, c_mk):
+    """
+    Evaluates the residual of the discretized momentum and continuity equations.
+
+    The interior rows are assembled with shifted slices (i-1, i, i+1) of the nodal arrays. The summation order of the
+    individual terms follows the node-by-node formulation of [1], such that the result is bit-identical to it.
+
+    All nodal arrays may carry a leading axis for a batch of independent tubes, see
+    perform_partitioned_theta_scheme_step_batched. In this case dx, tau and c_mk may be given per tube.
+
+    For a non-uniform grid, dx holds the N cell lengths, see grid_spacing. The control volume of an interior node then
+    extends to the midpoints of the adjacent cells and the boundary values are extrapolated linearly.
+
+    :return: residual of size 2N+2, velocity rows first, pressure (continuity) rows second
+    """
+    N = pressure0.shape[-1] - 1
+    dx, ratio_in, ratio_out = grid_spacing(dx, N)
+
+    # shifted views for the interior nodes i = 1, ..., N-1
+    im, ic, ip = slice(0, N - 1), slice(1, N), slice(2, N + 1)
+
+    A0, A1 = crossSection_couple[0], crossSection_couple[1]
+    u0m, u0c, u0p = velocity0[..., im], velocity0[..., ic], velocity0[..., ip]
+    u1m, u1c, u1p = velocity1[..., im], velocity1[..., ic], velocity1[..., ip]
+    p0m, p0c, p0p = pressure0[..., im], pressure0[..., ic], pressure0[..., ip]
+    p1m, p1c, p1p = pressure1[..., im], pressure1[..., ic], pressure1[..., ip]
+
+    res = np.zeros(pressure0.shape[:-1] + (2 * N + 2,))
+
+    # Momentum
+    mom = (velocity0[..., ic] * crossSection0[..., ic] - velocity1[..., ic] * crossSection1[..., ic]) * dx / tau
+
+    mom += .25 * theta * (- A1[..., ip] * u1c * u1p
+                          - A1[..., ic] * u1c * u1p)
+    mom += .25 * (1 - theta) * (- A0[..., ip] * u0c * u0p
+                                - A0[..., ic] * u0c * u0p)
+
+    mom += .25 * theta * (- A1[..., ip] * u1c * u1c
+                          - A1[..., ic] * u1c * u1c
+                          + A1[..., ic] * u1m * u1c
+                          + A1[..., im] * u1m * u1c)
+    mom += .25 * (1 - theta) * (- A0[..., ip] * u0c * u0c
+                                - A0[..., ic] * u0c * u0c
+                                + A0[..., ic] * u0m * u0c
+                                + A0[..., im] * u0m * u0c)
+
+    mom += .25 * theta * (+ A1[..., im] * u1m * u1m
+                          + A1[..., ic] * u1m * u1m)
+    mom += .25 * (1 - theta) * (+ A0[..., im] * u0m * u0m
+                                + A0[..., ic] * u0m * u0m)
+
+    mom += .25 * theta * (+ A1[..., im] * p1m
+                          + A1[..., ic] * p1m
+                          - A1[..., im] * p1c
+                          + A1[..., ip] * p1c
+                          - A1[..., ic] * p1p
+                          - A1[..., ip] * p1p)
+    mom += .25 * (1 - theta) * (+ A0[..., im] * p0m
+                                + A0[..., ic] * p0m
+                                - A0[..., im] * p0c
+                                + A0[..., ip] * p0c
+                                - A0[..., ic] * p0p
+                                - A0[..., ip] * p0p)
+    res[..., ic] = mom
+
+    # Continuity (we only care about values at n+1, see [2],p.737,eq.(3.16-25))
+    con = (crossSection0[..., ic] - crossSection1[..., ic]) * dx / tau
+    con += .25 * theta * (+ A1[..., im] * u1m
+                          + A1[..., ic] * u1m
+                          + A1[..., im] * u1c
+                          - A1[..., ip] * u1c
+                          - A1[..., ic] * u1p
+                          - A1[..., ip] * u1p)
+    con += .25 * (1 - theta) * (+ A0[..., im] * u0m
+                                + A0[..., ic] * u0m
+                                + A0[..., im] * u0c
+                                - A0[..., ip] * u0c
+                                - A0[..., ic] * u0p
+                                - A0[..., ip] * u0p)
+    con += alpha * theta * (p1m - 2 * p1c + p1p)
+    res[..., N + 2:2 * N + 1] = con
+
+    # Boundary
+
+    # Velocity Inlet is prescribed
+    res[..., 0] = velocity_in - velocity1[..., 0]
+
+    # Pressure Inlet is linearly interpolated
+    res[..., N + 1] = -pressure1[..., 0] + (1 + ratio_in) * pressure1[..., 1] - ratio_in * pressure1[..., 2]
+
+    # Velocity Outlet is linearly interpolated
+    res[..., N] = -velocity1[..., -1] + (1 + ratio_out) * velocity1[..., -2] - ratio_out * velocity1[..., -3]
+
+    # Pressure Outlet is "non-reflecting"
+    tmp2 = np.sqrt(c_mk ** 2 - pressure0[..., -1] / 2) - (velocity1[..., -1] - velocity0[..., -1]) / 4
+    res[..., 2 * N + 1] = -pressure1[..., -1] + 2 * (c_mk ** 2 - tmp2 * tmp2)
+
+    return res
+
+
+def _compute_residual_loop(velocity0, pressure0, crossSection0, crossSection1, crossSection_couple, velocity1,
+                           pressure1, dx, tau, velocity_in, theta, alpha, c_mk):
+    """
+    Reference implementation of compute_residual for a single tube, looping over the nodes like [1]. compute_residual
+    has to return the same result bit by bit, see checkResidual.py.
+    """
+    N = pressure0.shape[0] - 1
+    dx, ratio_in, ratio_out = grid_spacing(dx, N)
+
+    res = np.zeros(2 * N + 2)
+
+    for i in range(1, N):
+        h = dx if np.ndim(dx) == 0 else dx[i - 1]  # length of the control volume of node i
+
+        # Momentum
+        res[i] = (velocity0[i] * crossSection0[i] -
+                  velocity1[i] * crossSection1[i]) * h / tau
+
+        res[i] += .25 * theta * (- crossSection_couple[1][i + 1] * velocity1[i] * velocity1[i + 1]
+                                 - crossSection_couple[1][i] * velocity1[i] * velocity1[i + 1])
+        res[i] += .25 * (1 - theta) * (- crossSection_couple[0][i + 1] * velocity0[i] * velocity0[i + 1]
+                                       - crossSection_couple[0][i] * velocity0[i] * velocity0[i + 1])
+
+        res[i] += .25 * theta * (- crossSection_couple[1][i + 1] * velocity1[i] * velocity1[i]
+                                 - crossSection_couple[1][i] * velocity1[i] * velocity1[i]
+                                 + crossSection_couple[1][i] * velocity1[i - 1] * velocity1[i]
+                                 + crossSection_couple[1][i - 1] * velocity1[i - 1] * velocity1[i])
+        res[i] += .25 * (1 - theta) * (- crossSection_couple[0][i + 1] * velocity0[i] * velocity0[i]
+                                       - crossSection_couple[0][i] * velocity0[i] * velocity0[i]
+                                       + crossSection_couple[0][i] * velocity0[i - 1] * velocity0[i]
+                                       + crossSection_couple[0][i - 1] * velocity0[i - 1] * velocity0[i])
+
+        res[i] += .25 * theta * (+ crossSection_couple[1][i - 1] * velocity1[i - 1] * velocity1[i - 1]
+                                 + crossSection_couple[1][i] * velocity1[i - 1] * velocity1[i - 1])
+        res[i] += .25 * (1 - theta) * (+ crossSection_couple[0][i - 1] * velocity0[i - 1] * velocity0[i - 1]
+                                       + crossSection_couple[0][i] * velocity0[i - 1] * velocity0[i - 1])
+
+        res[i] += .25 * theta * (+ crossSection_couple[1][i - 1] * pressure1[i - 1]
+                                 + crossSection_couple[1][i] * pressure1[i - 1]
+                                 - crossSection_couple[1][i - 1] * pressure1[i]
+                                 + crossSection_couple[1][i + 1] * pressure1[i]
+                                 - crossSection_couple[1][i] * pressure1[i + 1]
+                                 - crossSection_couple[1][i + 1] * pressure1[i + 1])
+        res[i] += .25 * (1 - theta) * (+ crossSection_couple[0][i - 1] * pressure0[i - 1]
+                                       + crossSection_couple[0][i] * pressure0[i - 1]
+                                       - crossSection_couple[0][i - 1] * pressure0[i]
+                                       + crossSection_couple[0][i + 1] * pressure0[i]
+                                       - crossSection_couple[0][i] * pressure0[i + 1]
+                                       - crossSection_couple[0][i + 1] * pressure0[i + 1])
+
+        # Continuity (we only care about values at n+1, see [2],p.737,eq.(3.16-25))
+        res[i + N + 1] = (crossSection0[i] - crossSection1[i]) * h / tau
+        res[i + N + 1] += .25 * theta * (+ crossSection_couple[1][i - 1] * velocity1[i - 1]
+                                         + crossSection_couple[1][i] * velocity1[i - 1]
+                                         + crossSection_couple[1][i - 1] * velocity1[i]
+                                         - crossSection_couple[1][i + 1] * velocity1[i]
+                                         - crossSection_couple[1][i] * velocity1[i + 1]
+                                         - crossSection_couple[1][i + 1] * velocity1[i + 1])
+        res[i + N + 1] += .25 * (1 - theta) * (+ crossSection_couple[0][i - 1] * velocity0[i - 1]
+                                               + crossSection_couple[0][i] * velocity0[i - 1]
+                                               + crossSection_couple[0][i - 1] * velocity0[i]
+                                               - crossSection_couple[0][i + 1] * velocity0[i]
+                                               - crossSection_couple[0][i] * velocity0[i + 1]
+                                               - crossSection_couple[0][i + 1] * velocity0[i + 1])
+        res[i + N + 1] += alpha * theta * (pressure1[i - 1] - 2 * pressure1[i] + pressure1[i + 1])
+
+    # Boundary
+
+    # Velocity Inlet is prescribed
+    res[0] = velocity_in - velocity1[0]
+
+    # Pressure Inlet is linearly interpolated
+    res[N + 1] = -pressure1[0] + (1 + ratio_in) * pressure1[1] - ratio_in * pressure1[2]
+
+    # Velocity Outlet is linearly interpolated
+    res[N] = -velocity1[-1] + (1 + ratio_out) * velocity1[-2] - ratio_out * velocity1[-3]
+
+    # Pressure Outlet is "non-reflecting"
+    tmp2 = np.sqrt(c_mk ** 2 - pressure0[-1] / 2) - (velocity1[-1] - velocity0[-1]) / 4
+    res[2 * N + 1] = -pressure1[-1] + 2 * (c_mk ** 2 - tmp2 * tmp2)
+
+    return res
+
+
+def assemble_jacobian(velocity0, pressure0, crossSection1, crossSection_couple, velocity1, dx, tau, theta, alpha,
+                      c_mk):
+    """
+    Assembles the Jacobian of compute_residual with respect to (velocity1, pressure1) in sparse format.
+
+    Every interior row only couples to the nodes i-1, i, i+1 of both fields and the boundary rows touch at most three
+    entries. Therefore, the matrix is assembled directly from coordinate triplets and has O(N) non-zeros.
+
+    For a batch of M tubes (nodal arrays of shape (M, N+1), see perform_partitioned_theta_scheme_step_batched) the
+    Jacobians of the individual tubes are placed on the diagonal of one block diagonal matrix.
+
+    :return: Jacobian of size M(2N+2)xM(2N+2) as scipy.sparse.csc_matrix
+    """
+    N = pressure0.shape[-1] - 1
+    M = velocity1.shape[0] if velocity1.ndim > 1 else 1
+    dx, ratio_in, ratio_out = grid_spacing(dx, N)
+
+    velocity0, pressure0, crossSection1, velocity1 = [np.reshape(a, (M, N + 1)) for a in
+                                                      (velocity0, pressure0, crossSection1, velocity1)]
+    A1 = np.reshape(crossSection_couple[1], (M, N + 1))
+
+    # shifted views for the interior nodes i = 1, ..., N-1
+    im, ic, ip = slice(0, N - 1), slice(1, N), slice(2, N + 1)
+    i = np.arange(1, N)
+
+    u1m, u1c, u1p = velocity1[:, im], velocity1[:, ic], velocity1[:, ip]
+
+    # offset of the block belonging to each tube
+    offset = (2 * N + 2) * np.arange(M)[:, np.newaxis]
+
+    rows = []
+    cols = []
+    vals = []
+
+    def add(row, col, val):
+        row, col = np.broadcast_arrays(np.atleast_1d(row), np.atleast_1d(col))
+        rows.append((offset + row).ravel())
+        cols.append((offset + col).ravel())
+        vals.append(np.broadcast_to(val, (M, row.shape[0])).ravel())
+
+    # Momentum, Velocity see [1] eq. (13b)
+    add(i, i - 1, .25 * theta * (- 2 * A1[:, im] * u1m
+                                 - 2 * A1[:, ic] * u1m
+                                 - A1[:, ic] * u1c
+                                 - A1[:, im] * u1c))
+    add(i, i, crossSection1[:, ic] * dx / tau
+        + .25 * theta * (+ A1[:, ip] * u1p
+                         + A1[:, ic] * u1p
+                         + A1[:, ip] * u1c * 2
+                         + A1[:, ic] * u1c * 2
+                         - A1[:, ic] * u1m
+                         - A1[:, im] * u1m))
+    add(i, i + 1, .25 * theta * (A1[:, ip] * u1c
+                                 + A1[:, ic] * u1c))
+
+    # Momentum, Pressure see [1] eq. (13b)
+    add(i, N + 1 + i - 1, .25 * theta * (- A1[:, im] - A1[:, ic]))
+    add(i, N + 1 + i, .25 * theta * (+ A1[:, im] - A1[:, ip]))
+    add(i, N + 1 + i + 1, .25 * theta * (+ A1[:, ic] + A1[:, ip]))
+
+    # Continuity, Velocity see [1] eq. (13a)
+    add(i + N + 1, i - 1, .25 * theta * (- A1[:, im] - A1[:, ic]))
+    add(i + N + 1, i, .25 * theta * (- A1[:, im] + A1[:, ip]))
+    add(i + N + 1, i + 1, .25 * theta * (+ A1[:, ic] + A1[:, ip]))
+
+    # Continuity, Pressure see [1] eq. (13a)
+    if alpha != 0:
+        add(i + N + 1, N + 1 + i - 1, - alpha * theta)
+        add(i + N + 1, N + 1 + i, 2 * alpha * theta)
+        add(i + N + 1, N + 1 + i + 1, - alpha * theta)
+
+    # Velocity Inlet is prescribed
+    add(0, 0, 1.)
+    # Pressure Inlet is linearly interpolated [1] eq. (14a)
+    add(N + 1, np.array([N + 1, N + 2, N + 3]), np.stack([np.ones_like(ratio_in), -(1 + ratio_in), ratio_in], axis=-1))
+    # Velocity Outlet is linearly interpolated [1] eq. (14b)
+    add(N, np.array([N, N - 1, N - 2]), np.stack([np.ones_like(ratio_out), -(1 + ratio_out), ratio_out], axis=-1))
+
+    # Pressure Outlet is Non-Reflecting [1] eq. (15)
+    tmp2 = np.sqrt(c_mk ** 2 - pressure0[:, -1] / 2) - (velocity1[:, -1] - velocity0[:, -1]) / 4
+    add(2 * N + 1, np.array([2 * N + 1, N]), np.stack([np.ones(M), -tmp2], axis=-1))
+
+    # duplicate entries are summed up during the conversion
+    return sp.csc_matrix((np.concatenate(vals), (np.concatenate(rows), np.concatenate(cols))),
+                         shape=(M * (2 * N + 2), M * (2 * N + 2)))
+
+
+def assemble_banded_jacobian(velocity0, pressure0, crossSection1, crossSection_couple, velocity1, dx, tau, theta,
+                             alpha, c_mk):
+    """
+    Assembles the same Jacobian as assemble_jacobian directly in the LAPACK band storage of BandedLU, without the
+    detour over coordinate triplets and a sparse matrix.
+
+    The unknowns and the equations are ordered node by node, (v_0, p_0, v_1, p_1, ...) for every tube, i.e. velocity
+    and momentum of node i at position 2i and pressure and continuity of node i at position 2i+1. The entry in row r and
+    column c is stored in band[2k + r - c, c] with k = BandedLU.bandwidth. The differences r - c of all entries are
+    known in closed form, such that every diagonal of the band is written with one slice per field.
+
+    :return: band storage of shape (3k+1, M(2N+2)) for a batch of M tubes, see BandedLU
+    """
+    N = pressure0.shape[-1] - 1
+    M = velocity1.shape[0] if velocity1.ndim > 1 else 1
+    k = BandedLU.bandwidth
+    dx, ratio_in, ratio_out = grid_spacing(dx, N)
+
+    velocity0, pressure0, crossSection1, velocity1 = [np.reshape(a, (M, N + 1)) for a in
+                                                      (velocity0, pressure0, crossSection1, velocity1)]
+    A1 = np.reshape(crossSection_couple[1], (M, N + 1))
+
+    # shifted views for the interior nodes i = 1, ..., N-1
+    im, ic, ip = slice(0, N - 1), slice(1, N), slice(2, N + 1)
+
+    u1m, u1c, u1p = velocity1[:, im], velocity1[:, ic], velocity1[:, ip]
+
+    band = np.zeros((3 * k + 1, M * (2 * N + 2)), order='F')  # LAPACK needs k additional rows for the fill-in
+    # band[d, m, j, f] holds the entry of column (node j, field f) of tube m in row 2j + f + d - 2k
+    entries = band.reshape(3 * k + 1, M, N + 1, 2)
+    V, P = 0, 1
+
+    # Momentum (row 2i), Velocity see [1] eq. (13b)
+    entries[2 * k + 2, :, im, V] = .25 * theta * (- 2 * A1[:, im] * u1m
+                                                  - 2 * A1[:, ic] * u1m
+                                                  - A1[:, ic] * u1c
+                                                  - A1[:, im] * u1c)
+    entries[2 * k, :, ic, V] = (crossSection1[:, ic] * dx / tau
+                                + .25 * theta * (+ A1[:, ip] * u1p
+                                                 + A1[:, ic] * u1p
+                                                 + A1[:, ip] * u1c * 2
+                                                 + A1[:, ic] * u1c * 2
+                                                 - A1[:, ic] * u1m
+                                                 - A1[:, im] * u1m))
+    entries[2 * k - 2, :, ip, V] = .25 * theta * (A1[:, ip] * u1c
+                                                  + A1[:, ic] * u1c)
+
+    # Momentum (row 2i), Pressure see [1] eq. (13b)
+    entries[2 * k + 1, :, im, P] = .25 * theta * (- A1[:, im] - A1[:, ic])
+    entries[2 * k - 1, :, ic, P] = .25 * theta * (+ A1[:, im] - A1[:, ip])
+    entries[2 * k - 3, :, ip, P] = .25 * theta * (+ A1[:, ic] + A1[:, ip])
+
+    # Continuity (row 2i+1), Velocity see [1] eq. (13a)
+    entries[2 * k + 3, :, im, V] = .25 * theta * (- A1[:, im] - A1[:, ic])
+    entries[2 * k + 1, :, ic, V] = .25 * theta * (- A1[:, im] + A1[:, ip])
+    entries[2 * k - 1, :, ip, V] = .25 * theta * (+ A1[:, ic] + A1[:, ip])
+
+    # Continuity (row 2i+1), Pressure see [1] eq. (13a)
+    if alpha != 0:
+        entries[2 * k + 2, :, im, P] = - alpha * theta
+        entries[2 * k, :, ic, P] = 2 * alpha * theta
+        entries[2 * k - 2, :, ip, P] = - alpha * theta
+
+    # Velocity Inlet is prescribed (row 0)
+    entries[2 * k, :, 0, V] = 1.
+    # Pressure Inlet is linearly interpolated [1] eq. (14a) (row 1)
+    entries[2 * k, :, 0, P] = 1.
+    entries[2 * k - 2, :, 1, P] = -(1 + ratio_in)
+    entries[2 * k - 4, :, 2, P] = ratio_in
+    # Velocity Outlet is linearly interpolated [1] eq. (14b) (row 2N)
+    entries[2 * k, :, N, V] = 1.
+    entries[2 * k + 2, :, N - 1, V] = -(1 + ratio_out)
+    entries[2 * k + 4, :, N - 2, V] = ratio_out
+
+    # Pressure Outlet is Non-Reflecting [1] eq. (15) (row 2N+1)
+    tmp2 = np.sqrt(c_mk ** 2 - pressure0[:, -1] / 2) - (velocity1[:, -1] - velocity0[:, -1]) / 4
+    entries[2 * k, :, N, P] = 1.
+    entries[2 * k + 1, :, N, V] = -tmp2
+
+    return band
+
+
+class BandedLU(object):
+    """
+    LU factorization of the Jacobian of compute_residual in LAPACK band storage, with the same shape and solve() as the
+    factorization of scipy.sparse.linalg.splu.
+
+    The unknowns are reordered node by node, (v_0, p_0, v_1, p_1, ...) for every tube. Every row then only couples to
+    the unknowns of the nodes i-2, ..., i+2 (the boundary rows extrapolate over two cells) and the matrix has four sub-
+    and four superdiagonals, also for a block diagonal batch of tubes. Factorization and solution cost O(N) without
+    fill-in. Unlike scipy.linalg.solve_banded, the factors are kept, such that the chord iteration can reuse them.
+    """
+
+    bandwidth = 4
+
+    def __init__(self, band, N):
+        """
+        :param band: Jacobian in band storage from assemble_banded_jacobian, overwritten by the factorization
+        :param N: number of cells of each tube
+        :raises RuntimeError: if the matrix is exactly singular, like SuperLU
+        """
+        n = band.shape[1]
+        k = self.bandwidth
+        # unknown of the original layout at each position of the node-by-node layout
+        self.permutation = np.arange(n).reshape(-1, 2, N + 1).transpose(0, 2, 1).ravel()
+
+        self.factors, self.pivots, info = dgbtrf(band, k, k, overwrite_ab=True)
+        if info > 0:
+            raise RuntimeError("Factor is exactly singular")
+        self.shape = (n, n)
+
+    def solve(self, rhs):
+        solution, _ = dgbtrs(self.factors, self.bandwidth, self.bandwidth, rhs[self.permutation], self.pivots)
+        result = np.empty_like(solution)
+        result[self.permutation] = solution
+        return result
 
 
 def perform_partitioned_theta_scheme_step(velocity0, pressure0, crossSection0, crossSection1, dx, tau, velocity_in,
-                                          custom_coupling, theta=1):
+                                          custom_coupling, theta=1, solver_state=None, initial_guess=None):
 
     k = 0
 
     # initial guess for Newtons method
-    pressure1 = np.copy(pressure0)
-    velocity1 = np.copy(velocity0)
+    if initial_guess is None:
+        pressure1 = np.copy(pressure0)
+        velocity1 = np.copy(velocity0)
+    else:
+        velocity1 = np.copy(initial_guess[0])
+        pressure1 = np.copy(initial_guess[1])
 
     crossSection_couple = 2 * [None]
     if custom_coupling:
@@ -31,81 +570,28 @@ def perform_partitioned_theta_scheme_step(velocity0, pressure0, crossSection0, c
     alpha = 0
     success = True
 
+    if solver_state is None:
+        solver_state = NonlinearSolverState()
+    if solver_state.cache is not None:
+        cache_key = solver_state.cache.key(velocity0, pressure0, crossSection0, crossSection1, dx, tau, velocity_in,
+                                           custom_coupling, theta)
+        cached = solver_state.cache.lookup(cache_key)
+        if cached is not None:
+            solver_state.statistics = NonlinearSolverStatistics()
+            return cached[0], cached[1], True
+    reuse_jacobian = solver_state.mode is NonlinearSolverModes.CHORD
+    norm_old = None
+    statistics = solver_state.statistics = NonlinearSolverStatistics()
+
     E = 10000  # elasticity module
     c_mk = np.sqrt(E / 2 * np.sqrt(np.pi))  # wave speed
 
     while success:  # perform Newton iterations to solve nonlinear system of equations
 
-        # compute residual
-        res = np.zeros(2 * N + 2)
-
-        for i in range(1, N):
-            # Momentum
-            res[i] = (velocity0[i] * crossSection0[i] -
-                      velocity1[i] * crossSection1[i]) * dx / tau
-
-            res[i] += .25 * theta * (- crossSection_couple[1][i + 1] * velocity1[i] * velocity1[i + 1]
-                                     - crossSection_couple[1][i] * velocity1[i] * velocity1[i + 1])
-            res[i] += .25 * (1 - theta) * (- crossSection_couple[0][i + 1] * velocity0[i] * velocity0[i + 1]
-                                           - crossSection_couple[0][i] * velocity0[i] * velocity0[i + 1])
-
-            res[i] += .25 * theta * (- crossSection_couple[1][i + 1] * velocity1[i] * velocity1[i]
-                                     - crossSection_couple[1][i] * velocity1[i] * velocity1[i]
-                                     + crossSection_couple[1][i] * velocity1[i - 1] * velocity1[i]
-                                     + crossSection_couple[1][i - 1] * velocity1[i - 1] * velocity1[i])
-            res[i] += .25 * (1 - theta) * (- crossSection_couple[0][i + 1] * velocity0[i] * velocity0[i]
-                                           - crossSection_couple[0][i] * velocity0[i] * velocity0[i]
-                                           + crossSection_couple[0][i] * velocity0[i - 1] * velocity0[i]
-                                           + crossSection_couple[0][i - 1] * velocity0[i - 1] * velocity0[i])
-
-            res[i] += .25 * theta * (+ crossSection_couple[1][i - 1] * velocity1[i - 1] * velocity1[i - 1]
-                                     + crossSection_couple[1][i] * velocity1[i - 1] * velocity1[i - 1])
-            res[i] += .25 * (1 - theta) * (+ crossSection_couple[0][i - 1] * velocity0[i - 1] * velocity0[i - 1]
-                                           + crossSection_couple[0][i] * velocity0[i - 1] * velocity0[i - 1])
-
-            res[i] += .25 * theta * (+ crossSection_couple[1][i - 1] * pressure1[i - 1]
-                                     + crossSection_couple[1][i] * pressure1[i - 1]
-                                     - crossSection_couple[1][i - 1] * pressure1[i]
-                                     + crossSection_couple[1][i + 1] * pressure1[i]
-                                     - crossSection_couple[1][i] * pressure1[i + 1]
-                                     - crossSection_couple[1][i + 1] * pressure1[i + 1])
-            res[i] += .25 * (1 - theta) * (+ crossSection_couple[0][i - 1] * pressure0[i - 1]
-                                           + crossSection_couple[0][i] * pressure0[i - 1]
-                                           - crossSection_couple[0][i - 1] * pressure0[i]
-                                           + crossSection_couple[0][i + 1] * pressure0[i]
-                                           - crossSection_couple[0][i] * pressure0[i + 1]
-                                           - crossSection_couple[0][i + 1] * pressure0[i + 1])
-
-            # Continuity (we only care about values at n+1, see [2],p.737,eq.(3.16-25))
-            res[i + N + 1] = (crossSection0[i] - crossSection1[i]) * dx / tau
-            res[i + N + 1] += .25 * theta * (+ crossSection_couple[1][i - 1] * velocity1[i - 1]
-                                             + crossSection_couple[1][i] * velocity1[i - 1]
-                                             + crossSection_couple[1][i - 1] * velocity1[i]
-                                             - crossSection_couple[1][i + 1] * velocity1[i]
-                                             - crossSection_couple[1][i] * velocity1[i + 1]
-                                             - crossSection_couple[1][i + 1] * velocity1[i + 1])
-            res[i + N + 1] += .25 * (1 - theta) * (+ crossSection_couple[0][i - 1] * velocity0[i - 1]
-                                                   + crossSection_couple[0][i] * velocity0[i - 1]
-                                                   + crossSection_couple[0][i - 1] * velocity0[i]
-                                                   - crossSection_couple[0][i + 1] * velocity0[i]
-                                                   - crossSection_couple[0][i] * velocity0[i + 1]
-                                                   - crossSection_couple[0][i + 1] * velocity0[i + 1])
-            res[i + N + 1] += alpha * theta * (pressure1[i - 1] - 2 * pressure1[i] + pressure1[i + 1])
-
-        # Boundary
-
-        # Velocity Inlet is prescribed
-        res[0] = velocity_in - velocity1[0]
-
-        # Pressure Inlet is linearly interpolated
-        res[N + 1] = -pressure1[0] + 2 * pressure1[1] - pressure1[2]
-
-        # Velocity Outlet is linearly interpolated
-        res[N] = -velocity1[-1] + 2 * velocity1[-2] - velocity1[-3]
-
-        # Pressure Outlet is "non-reflecting"
-        tmp2 = np.sqrt(c_mk ** 2 - pressure0[-1] / 2) - (velocity1[-1] - velocity0[-1]) / 4
-        res[2 * N + 1] = -pressure1[-1] + 2 * (c_mk ** 2 - tmp2 * tmp2)
+        tic = time.perf_counter()
+        res = compute_residual(velocity0, pressure0, crossSection0, crossSection1, crossSection_couple, velocity1,
+                               pressure1, dx, tau, velocity_in, theta, alpha, c_mk)
+        statistics.time_residual += time.perf_counter() - tic
 
         k += 1  # Iteration Count
 
@@ -113,6 +599,7 @@ def perform_partitioned_theta_scheme_step(velocity0, pressure0, crossSection0, c
         norm_1 = np.sqrt(res.dot(res))
         norm_2 = np.sqrt(pressure1.dot(pressure1) + velocity1.dot(velocity1))
         norm = norm_1 / norm_2
+        statistics.residuals.append(float(norm))
 
         if norm < 1e-10 and k > 1:
             break  # Nonlinear Solver success
@@ -126,77 +613,155 @@ def perform_partitioned_theta_scheme_step(velocity0, pressure0, crossSection0, c
         # else:
         # perform another iteration of newton's method
 
-        # compute Jacobian for Newton's method
-        system = np.zeros([N + N + 2, N + N + 2])
-
-        for i in range(1, N):
-            # Momentum, Velocity see [1] eq. (13b)
-            system[i][i - 1] += .25 * theta * (- 2 * crossSection_couple[1][i - 1] * velocity1[i - 1]
-                                               - 2 * crossSection_couple[1][i] * velocity1[i - 1]
-                                               - crossSection_couple[1][i] * velocity1[i]
-                                               - crossSection_couple[1][i - 1] * velocity1[i])
-            system[i][i] += crossSection1[i] * dx / tau
-            system[i][i] += .25 * theta * (+ crossSection_couple[1][i + 1] * velocity1[i + 1]
-                                           + crossSection_couple[1][i] * velocity1[i + 1]
-                                           + crossSection_couple[1][i + 1] * velocity1[i] * 2
-                                           + crossSection_couple[1][i] * velocity1[i] * 2
-                                           - crossSection_couple[1][i] * velocity1[i - 1]
-                                           - crossSection_couple[1][i - 1] * velocity1[i - 1])
-            system[i][i + 1] += .25 * theta * (crossSection_couple[1][i + 1] * velocity1[i]
-                                               + crossSection_couple[1][i] * velocity1[i])
-
-            # Momentum, Pressure see [1] eq. (13b)
-            system[i][N + 1 + i - 1] += .25 * theta * (- crossSection_couple[1][i - 1] - crossSection_couple[1][i])
-            system[i][N + 1 + i] += .25 * theta * (+ crossSection_couple[1][i - 1] - crossSection_couple[1][i + 1])
-            system[i][N + 1 + i + 1] += .25 * theta * (+ crossSection_couple[1][i] + crossSection_couple[1][i + 1])
-
-            # Continuity, Velocity see [1] eq. (13a)
-            system[i + N + 1][i - 1] += .25 * theta * (- crossSection_couple[1][i - 1] - crossSection_couple[1][i])
-            system[i + N + 1][i] += .25 * theta * (- crossSection_couple[1][i - 1] + crossSection_couple[1][i + 1])
-            system[i + N + 1][i + 1] += .25 * theta * (+ crossSection_couple[1][i] + crossSection_couple[1][i + 1])
-
-            # Continuity, Pressure see [1] eq. (13a)
-            system[i + N + 1][N + 1 + i - 1] += - alpha * theta
-            system[i + N + 1][N + 1 + i] += 2 * alpha * theta
-            system[i + N + 1][N + 1 + i + 1] += - alpha * theta
-
-        # Velocity Inlet is prescribed
-        system[0][0] = 1
-        # Pressure Inlet is linearly interpolated [1] eq. (14a)
-        system[N + 1][N + 1] = 1
-        system[N + 1][N + 2] = -2
-        system[N + 1][N + 3] = 1
-        # Velocity Outlet is linearly interpolated [1] eq. (14b)
-        system[N][N] = 1
-        system[N][N - 1] = -2
-        system[N][N - 2] = 1
-
-        # Pressure Outlet is Non-Reflecting [1] eq. (15)
-        system[2 * N + 1][2 * N + 1] = 1
-        system[2 * N + 1][N] = -(np.sqrt(c_mk ** 2 - pressure0[-1] / 2) - (velocity1[-1] - velocity0[-1]) / 4)
+        # refactorize, if the Jacobian is not reused or if the chord iteration does not contract sufficiently
+        if not reuse_jacobian or solver_state.lu is None or solver_state.lu.shape != (2 * N + 2, 2 * N + 2) or \
+                (norm_old is not None and norm > solver_state.max_contraction * norm_old):
+            # compute Jacobian for Newton's method
+            tic = time.perf_counter()
+            band = assemble_banded_jacobian(velocity0, pressure0, crossSection1, crossSection_couple, velocity1, dx,
+                                            tau, theta, alpha, c_mk)
+            try:
+                solver_state.lu = BandedLU(band, N)
+            except RuntimeError:  # raised if the factor is exactly singular
+                print("LINALGERROR! SINGULAR MATRIX")
+                solver_state.lu = None
+                velocity1[:] = np.nan
+                pressure1[:] = np.nan
+                success = False
+                break
+            finally:
+                statistics.time_jacobian += time.perf_counter() - tic
+            solver_state.factorizations += 1
+        norm_old = norm
+
+        tic = time.perf_counter()
+
+        solution = solver_state.lu.solve(res)
+        statistics.time_solve += time.perf_counter() - tic
+        solver_state.iterations += 1
+        statistics.iterations += 1
+
+        velocity1 += solution[:N + 1]
+        pressure1 += solution[N + 1:]
+
+    if success and solver_state.cache is not None:
+        solver_state.cache.store(cache_key, velocity1, pressure1)
+
+    return velocity1, pressure1, success
 
+
+def perform_partitioned_theta_scheme_step_batched(velocity0, pressure0, crossSection0, crossSection1, dx, tau,
+                                                  velocity_in, custom_coupling, theta=1, E=10000):
+    """
+    Advances a batch of M independent tubes by one step of perform_partitioned_theta_scheme_step, e.g. for parameter
+    sweeps over the inflow velocity or the elasticity module.
+
+    All nodal arrays have the shape (M, N+1). velocity_in and E are scalars or arrays of shape (M,). dx and tau are
+    scalars or arrays of shape (M, 1). All tubes that did not converge yet are solved simultaneously by one banded
+    factorization of the block diagonal Jacobian per Newton iteration, see BandedLU. Converged tubes are not updated
+    anymore.
+
+    :return: velocity1 and pressure1 of shape (M, N+1), success of shape (M,)
+    """
+    # initial guess for Newtons method
+    pressure1 = np.copy(pressure0)
+    velocity1 = np.copy(velocity0)
+
+    if custom_coupling:
+        # set cross sections corresponding to point in time
+        crossSection_couple = [crossSection0, crossSection1]
+    else:
+        # set both cross sections equal to input -> depending on input: implicit or explicit coupling
+        crossSection_couple = [crossSection1, crossSection1]
+
+    M, N = pressure0.shape[0], pressure0.shape[1] - 1
+
+    alpha = 0
+
+    # per tube parameters
+    dx = np.broadcast_to(dx, (M, 1))
+    tau = np.broadcast_to(tau, (M, 1))
+    velocity_in = np.broadcast_to(velocity_in, (M,))
+    c_mk = np.sqrt(np.broadcast_to(E, (M,)) / 2 * np.sqrt(np.pi))  # wave speed
+
+    k = np.zeros(M, dtype=int)  # iteration count per tube
+    active = np.ones(M, dtype=bool)  # tubes that did not converge yet
+    success = np.ones(M, dtype=bool)
+
+    while np.any(active):  # perform Newton iterations to solve nonlinear system of equations
+        a = np.flatnonzero(active)
+
+        res = compute_residual(velocity0[a], pressure0[a], crossSection0[a], crossSection1[a],
+                               [crossSection_couple[0][a], crossSection_couple[1][a]], velocity1[a], pressure1[a],
+                               dx[a], tau[a], velocity_in[a], theta, alpha, c_mk[a])
+
+        k[a] += 1  # Iteration Count
+
+        # compute relative norm of residual
+        norm_1 = np.sqrt(np.sum(res * res, axis=1))
+        norm_2 = np.sqrt(np.sum(pressure1[a] * pressure1[a], axis=1) + np.sum(velocity1[a] * velocity1[a], axis=1))
+        norm = norm_1 / norm_2
+
+        converged = (norm < 1e-10) & (k[a] > 1)
+        failed = ~converged & (k[a] > 1000)
+        if np.any(failed):
+            print("Nonlinear Solver break for %i tubes, iterations: %i\n" % (np.count_nonzero(failed), k[a].max()))
+            velocity1[a[failed]] = np.nan
+            pressure1[a[failed]] = np.nan
+            success[a[failed]] = False
+        active[a[converged | failed]] = False
+
+        # perform another iteration of newton's method for the remaining tubes
+        keep = ~(converged | failed)
+        a = a[keep]
+        if a.size == 0:
+            break
+
+        # compute block diagonal Jacobian for Newton's method
+        band = assemble_banded_jacobian(velocity0[a], pressure0[a], crossSection1[a],
+                                        [None, crossSection_couple[1][a]], velocity1[a], dx[a], tau[a], theta, alpha,
+                                        c_mk[a])
         try:
-            solution = np.linalg.solve(system, res)
-        except np.linalg.LinAlgError:
+            solution = BandedLU(band, N).solve(res[keep].ravel()).reshape(a.size, 2 * N + 2)
+        except RuntimeError:  # raised if the factor is exactly singular
             print("LINALGERROR! SINGULAR MATRIX")
-            velocity1[:] = np.nan
-            pressure1[:] = np.nan
-            success = False
+            velocity1[a] = np.nan
+            pressure1[a] = np.nan
+            success[a] = False
             break
 
-        velocity1 += solution[:N + 1]
-        pressure1 += solution[N + 1:]
+        velocity1[a] += solution[:, :N + 1]
+        pressure1[a] += solution[:, N + 1:]
 
     return velocity1, pressure1, success
 
 
 def perform_partitioned_implicit_euler_step(velocity0, pressure0, crossSection0, crossSection1, dx, tau,
-                                            velocity_in, custom_coupling):
+                                            velocity_in, custom_coupling, solver_state=None, initial_guess=None):
     return perform_partitioned_theta_scheme_step(velocity0, pressure0, crossSection0, crossSection1, dx, tau,
-                                                 velocity_in, custom_coupling=False, theta=1)
+                                                 velocity_in, custom_coupling=False, theta=1,
+                                                 solver_state=solver_state, initial_guess=initial_guess)
 
 
 def perform_partitioned_implicit_trapezoidal_rule_step(velocity0, pressure0, crossSection0, crossSection1, dx, tau,
-                                                       velocity_in, custom_coupling):
+                                                       velocity_in, custom_coupling, solver_state=None,
+                                                       initial_guess=None):
     return perform_partitioned_theta_scheme_step(velocity0, pressure0, crossSection0, crossSection1, dx, tau,
-                                                 velocity_in, custom_coupling, theta=.5)
+                                                 velocity_in, custom_coupling, theta=.5, solver_state=solver_state,
+                                                 initial_guess=initial_guess)
+
+
+def extrapolate_initial_guess(history):
+    """
+    Extrapolates an initial guess for Newton's method from the converged states of the previous time windows.
+
+    :param history: list of (velocity, pressure) of the previous time windows, newest first. Up to three states are
+    used for a constant, linear or quadratic extrapolation with constant timestep size.
+    :return: (velocity, pressure) or None, if the history is empty
+    """
+    if not history:
+        return None
+    weights = [[1], [2, -1], [3, -3, 1]][min(len(history), 3) - 1]
+    velocity = sum(w * v for w, (v, _) in zip(weights, history))
+    pressure = sum(w * p for w, (_, p) in zip(weights, history))
+    return velocity, pressure
@@ -0,0 +1,128 @@
+# Theta scheme for a tree of tube segments, e.g. arteries with bifurcations. Each segment is discretized as in
+# thetaScheme.py. At each junction the outlet of one parent segment is connected to the inlets of its child segments.
+# There, conservation of mass and continuity of the pressure are enforced, see
+# [3] L. Formaggia, D. Lamponi, and A. Quarteroni. One-dimensional models for blood flow in arteries. Journal of
+# Engineering Mathematics, 2003.
+
+from __future__ import division, print_function
+import numpy as np
+import scipy.sparse as sp
+from scipy.sparse.linalg import splu
+from thetaScheme import compute_residual, assemble_jacobian
+
+
+def assemble_junctions(parent, crossSection1, velocity1, pressure1):
+    """
+    Residual and Jacobian of the junction conditions. The velocity inlet condition of every child segment is replaced
+    by continuity of the pressure and the non-reflecting outlet condition of every parent segment by conservation of
+    mass.
+
+    :return: global indices of the replaced rows, their residual and their rows of the Jacobian
+    """
+    M, N = pressure1.shape[0], pressure1.shape[1] - 1
+    n = 2 * N + 2
+    parent = np.asarray(parent)
+
+    # Pressure is continuous: p_parent[N] - p_child[0] = 0
+    child = np.flatnonzero(parent >= 0)
+    p = parent[child]
+    pressure_rows = child * n
+    pressure_res = pressure1[p, -1] - pressure1[child, 0]
+
+    # Mass is conserved: sum_children A_child[0] * u_child[0] - A_parent[N] * u_parent[N] = 0
+    junction = np.unique(p)
+    mass_rows = junction * n + 2 * N + 1
+    mass_res = -crossSection1[junction, -1] * velocity1[junction, -1]
+    np.add.at(mass_res, np.searchsorted(junction, p), crossSection1[child, 0] * velocity1[child, 0])
+
+    rows = np.concatenate([pressure_rows, pressure_rows,
+                           mass_rows, mass_rows[np.searchsorted(junction, p)]])
+    cols = np.concatenate([child * n + N + 1, p * n + 2 * N + 1,
+                           junction * n + N, child * n])
+    vals = np.concatenate([np.ones(child.size), -np.ones(child.size),
+                           crossSection1[junction, -1], -crossSection1[child, 0]])
+
+    replaced_rows = np.concatenate([pressure_rows, mass_rows])
+    system = sp.csc_matrix((vals, (rows, cols)), shape=(M * n, M * n))
+    return replaced_rows, np.concatenate([pressure_res, mass_res]), system
+
+
+def perform_network_theta_scheme_step(velocity0, pressure0, crossSection0, crossSection1, dx, tau, velocity_in,
+                                      parent, custom_coupling, theta=1, E=10000):
+    """
+    Performs one step of the theta scheme for a tree of M tube segments with N cells each. All segments are solved
+    together with one sparse factorization of the block-sparse Jacobian per Newton iteration.
+
+    All nodal arrays have the shape (M, N+1). Segments of different length are obtained by passing dx of shape (M, 1).
+    velocity_in is prescribed at the inlet of the segments without parent, E may be given per segment.
+
+    :param parent: index of the parent segment of every segment, -1 for segments at the inlet of the network
+    :return: velocity1 and pressure1 of shape (M, N+1), success
+    """
+    # initial guess for Newtons method
+    pressure1 = np.copy(pressure0)
+    velocity1 = np.copy(velocity0)
+
+    if custom_coupling:
+        # set cross sections corresponding to point in time
+        crossSection_couple = [crossSection0, crossSection1]
+    else:
+        # set both cross sections equal to input -> depending on input: implicit or explicit coupling
+        crossSection_couple = [crossSection1, crossSection1]
+
+    M, N = pressure0.shape[0], pressure0.shape[1] - 1
+
+    alpha = 0
+    success = True
+    k = 0
+
+    # per segment parameters
+    dx = np.broadcast_to(dx, (M, 1))
+    tau = np.broadcast_to(tau, (M, 1))
+    velocity_in = np.broadcast_to(velocity_in, (M,))
+    c_mk = np.sqrt(np.broadcast_to(E, (M,)) / 2 * np.sqrt(np.pi))  # wave speed
+
+    while success:  # perform Newton iterations to solve nonlinear system of equations
+
+        res = compute_residual(velocity0, pressure0, crossSection0, crossSection1, crossSection_couple, velocity1,
+                               pressure1, dx, tau, velocity_in, theta, alpha, c_mk).ravel()
+        replaced_rows, junction_res, junction_system = assemble_junctions(parent, crossSection1, velocity1,
+                                                                          pressure1)
+        res[replaced_rows] = junction_res
+
+        k += 1  # Iteration Count
+
+        # compute relative norm of residual
+        norm_1 = np.sqrt(res.dot(res))
+        norm_2 = np.sqrt(np.sum(pressure1 * pressure1) + np.sum(velocity1 * velocity1))
+        norm = norm_1 / norm_2
+
+        if norm < 1e-10 and k > 1:
+            break  # Nonlinear Solver success
+        elif k > 1000:
+            print(
+                "Nonlinear Solver break, iterations: %i, residual norm: %e\n" % (k, norm))
+            velocity1[:] = np.nan
+            pressure1[:] = np.nan
+            success = False
+            break
+
+        # compute Jacobian for Newton's method: block diagonal segment Jacobians with the junction rows replaced
+        keep = np.ones(M * (2 * N + 2))
+        keep[replaced_rows] = 0
+        system = sp.diags(keep) @ assemble_jacobian(velocity0, pressure0, crossSection1, crossSection_couple,
+                                                    velocity1, dx, tau, theta, alpha, c_mk) + junction_system
+
+        try:
+            solution = splu(sp.csc_matrix(system)).solve(res).reshape(M, 2 * N + 2)
+        except RuntimeError:  # raised by SuperLU if the factor is exactly singular
+            print("LINALGERROR! SINGULAR MATRIX")
+            velocity1[:] = np.nan
+            pressure1[:] = np.nan
+            success = False
+            break
+
+        velocity1 += solution[:, :N + 1]
+        pressure1 += solution[:, N + 1:]
+
+    return velocity1, pressure1, success
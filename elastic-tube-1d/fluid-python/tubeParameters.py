@@ -0,0 +1,22 @@
+from __future__ import division
+import numpy as np
+
+# physical properties of the tube, shared by the Python fluid scripts. SolidSolver.py uses the same values.
+r0 = 1 / np.sqrt(np.pi)  # radius of the tube
+a0 = r0**2 * np.pi  # cross sectional area
+u0 = 10  # mean velocity
+ampl = 3  # amplitude of varying velocity
+frequency = 10  # frequency of variation
+t_shift = 0  # temporal shift of variation
+p0 = 0  # pressure at outlet
+kappa = 100
+E = 10000  # elasticity module
+c_mk = np.sqrt(E / 2 * np.sqrt(np.pi))  # wave speed, see monolithicScheme.py
+
+L = 10  # length of tube/simulation domain
+N = 100
+dx = L / kappa
+
+
+def velocity_in(t): return u0 + ampl * np.sin(frequency *
+                                              (t + t_shift) * np.pi)  # inflow velocity
@@ -1,5 +1,6 @@
 import matplotlib.pyplot as plt
 from matplotlib.patches import Rectangle
+from matplotlib.collections import PolyCollection, LineCollection
 import numpy as np
 
 scaling_factor = 50
@@ -48,3 +49,87 @@ def doPlotting(ax, crossSection0, velocity0, pressure0, dx, t):
     plt.title(t)
     plt.pause(0.1)
     # ax[1].cla()
+
+
+class TubeRenderer(object):
+    """
+    Live plot of the tube like plotTube. The artists are only created once and updated in place for every frame. With
+    blit = True, only the updated artists are redrawn on top of a cached background of the figure.
+    """
+
+    def __init__(self, ax, N, dx, blit=True):
+        """
+        :param ax: axes to draw into
+        :param N: number of nodes
+        :param dx: distance of the nodes or array of the N-1 cell lengths of a non-uniform grid
+        :param blit: use blitting. Artists drawn with blitting do not show up in a full redraw of the figure, e.g. when
+        grabbing frames for a video, therefore blitting has to be disabled in this case.
+        """
+        self.ax = ax
+        self.canvas = ax.figure.canvas
+        if np.ndim(dx) == 0:
+            self.x = np.arange(N) * dx
+            left, right = self.x - .5 * dx, self.x + .5 * dx
+        else:  # the rectangle of a node extends to the midpoints of the adjacent cells
+            self.x = np.concatenate([[0.], np.cumsum(dx)])
+            faces = np.concatenate([[-.5 * dx[0]], .5 * (self.x[:-1] + self.x[1:]), [self.x[-1] + .5 * dx[-1]]])
+            left, right = faces[:-1], faces[1:]
+        self.dx = dx
+        self.blit = blit
+        self.map = plt.get_cmap('RdBu')
+        self.background = None
+
+        # one rectangle per node, the vertices are updated in place
+        self.verts = np.zeros([N, 4, 2])
+        self.verts[:, [0, 3], 0] = left[:, np.newaxis]
+        self.verts[:, [1, 2], 0] = right[:, np.newaxis]
+        self.rects = PolyCollection(self.verts, animated=blit)
+        # upper and lower wall of the tube
+        self.walls = np.zeros([2, N, 2])
+        self.walls[:, :, 0] = self.x
+        self.lines = LineCollection(self.walls, colors='k', animated=blit)
+        self.title = ax.set_title("", animated=blit)
+
+        ax.add_collection(self.rects)
+        ax.add_collection(self.lines)
+        ax.set_xlim([left[0], right[-1]])
+        ax.set_ylim([-2, 2])
+
+        if blit:
+            self.canvas.mpl_connect('draw_event', self._on_draw)
+        plt.show(block=False)
+        self.canvas.draw()
+
+    def _on_draw(self, event):
+        # cache everything except the animated artists, e.g. after resizing the window
+        self.background = self.canvas.copy_from_bbox(self.canvas.figure.bbox)
+        self._draw_artists()
+
+    def _draw_artists(self):
+        for artist in [self.rects, self.lines, self.title]:
+            self.ax.figure.draw_artist(artist)
+
+    def update(self, crossSection, velocity, pressure, t):
+        """
+        Draws a new frame without blocking.
+        """
+        u0 = 10
+        ampl = 3
+
+        dy = r0 + (np.sqrt(crossSection / np.pi) - r0) * scaling_factor
+        self.verts[:, [0, 1], 1] = -dy[:, np.newaxis]
+        self.verts[:, [2, 3], 1] = dy[:, np.newaxis]
+        self.rects.set_verts(self.verts)
+        self.rects.set_facecolor(self.map((velocity + u0) / ampl))
+        self.walls[0, :, 1] = dy
+        self.walls[1, :, 1] = -dy
+        self.lines.set_segments(self.walls)
+        self.title.set_text(t)
+
+        if self.blit and self.background is not None:
+            self.canvas.restore_region(self.background)
+            self._draw_artists()
+            self.canvas.blit(self.canvas.figure.bbox)
+        else:
+            self.canvas.draw_idle()
+        self.canvas.flush_events()
@@ -0,0 +1,330 @@
+"""
+Local stand-in for the preCICE Python bindings. It couples participants that run as threads of a single Python process
+and supports the subset of precice.Interface that is used by FluidSolver.py and SolidSolver.py: block scalar data,
+nearest-neighbor mapping, a serial-implicit coupling scheme with IQN-ILS acceleration and the actions for initial data
+and iteration checkpoints. The coupling scheme is read from precice-config.xml.
+
+Use it by registering it as precice module before the participants are started, see run-in-process.py.
+"""
+
+from __future__ import division, print_function
+import re
+import threading
+import numpy as np
+from scipy.spatial import cKDTree
+
+
+def action_write_initial_data(): return "write-initial-data"
+
+
+def action_write_iteration_checkpoint(): return "write-iteration-checkpoint"
+
+
+def action_read_iteration_checkpoint(): return "read-iteration-checkpoint"
+
+
+def _attributes(tag, text):
+    """
+    Returns the attributes of all XML elements with the given tag. precice-config.xml uses undeclared namespace
+    prefixes, e.g. <data:scalar>, therefore it is parsed with regular expressions instead of an XML parser.
+    """
+    return [dict(re.findall(r'([\w-]+)="([^"]*)"', attributes))
+            for attributes in re.findall(r'<' + tag + r'\s([^>]*?)/?>', text, re.DOTALL)]
+
+
+class IQNILSAcceleration(object):
+    """
+    Interface quasi-Newton acceleration with least-squares approximation of the inverse Jacobian (IQN-ILS). Differences
+    of the residuals and of the outputs are collected in the columns of V and W and reused for time_windows_reused time
+    windows. Columns that are nearly linearly dependent on newer columns are removed like by the QR2 filter of preCICE.
+    """
+
+    def __init__(self, initial_relaxation, max_used_iterations, time_windows_reused, filter_limit):
+        self.initial_relaxation = initial_relaxation
+        self.max_used_iterations = max_used_iterations
+        self.time_windows_reused = time_windows_reused
+        self.filter_limit = filter_limit
+        self.V, self.W = [], []  # columns of the current time window, newest first
+        self.reused = []  # columns of previous time windows, newest first
+        self.residual_old = None
+        self.output_old = None
+
+    def _filter(self, V, W):
+        Q = []
+        V_filtered, W_filtered = [], []
+        for v, w in zip(V, W):
+            v_orthogonal = v - sum(q.dot(v) * q for q in Q)
+            if np.linalg.norm(v_orthogonal) < self.filter_limit * np.linalg.norm(v):
+                continue
+            Q.append(v_orthogonal / np.linalg.norm(v_orthogonal))
+            V_filtered.append(v)
+            W_filtered.append(w)
+        return V_filtered, W_filtered
+
+    def compute(self, x, x_tilde):
+        """
+        :param x: input of the iteration, i.e. the values sent to the other participant
+        :param x_tilde: output of the iteration
+        :return: input of the next iteration
+        """
+        residual = x_tilde - x
+        if self.residual_old is not None:
+            self.V.insert(0, residual - self.residual_old)
+            self.W.insert(0, x_tilde - self.output_old)
+        self.residual_old, self.output_old = residual, x_tilde
+
+        V, W = [], []
+        for V_window, W_window in [(self.V, self.W)] + self.reused:
+            V += V_window
+            W += W_window
+        V, W = self._filter(V[:self.max_used_iterations], W[:self.max_used_iterations])
+
+        if not V:
+            return x + self.initial_relaxation * residual
+        alpha = np.linalg.lstsq(np.array(V).T, -residual, rcond=None)[0]
+        return x_tilde + np.array(W).T.dot(alpha)
+
+    def complete_window(self):
+        if self.V:
+            self.reused = ([(self.V, self.W)] + self.reused)[:self.time_windows_reused]
+        self.V, self.W = [], []
+        self.residual_old = None
+        self.output_old = None
+
+
+class SerialImplicitCoupling(object):
+    """
+    Serial-implicit coupling of two participants running in different threads. Only one participant computes at a time,
+    the other one waits in advance or initialize_data until it is its turn. Convergence measures and acceleration are
+    evaluated in advance of the second participant.
+    """
+
+    def __init__(self, configurationFileName):
+        with open(configurationFileName) as f:
+            text = f.read()
+
+        if "<coupling-scheme:serial-implicit" not in text:
+            raise ValueError("Only serial-implicit coupling schemes are supported by the local interface.")
+
+        participants = _attributes("participants", text)[0]
+        self.first, self.second = participants["first"], participants["second"]
+        self.max_time = float(_attributes("max-time", text)[0]["value"])
+        self.dt = float(_attributes("time-window-size", text)[0]["value"])
+        self.max_iterations = int(_attributes("max-iterations", text)[0]["value"])
+        self.exchanges = _attributes("exchange", text)
+        self.measures = {measure["data"]: float(measure["limit"])
+                         for measure in _attributes("relative-convergence-measure", text)}
+        self.provided_meshes = {use_mesh["name"]: participant["name"]
+                                for participant, block in zip(_attributes("participant", text),
+                                                              re.findall(r'<participant\s.*?</participant>', text,
+                                                                         re.DOTALL))
+                                for use_mesh in _attributes("use-mesh", block) if use_mesh.get("provide") == "yes"}
+
+        self.acceleration = None
+        self.accelerated_data = None
+        if "<acceleration:IQN-ILS" in text:
+            block = re.findall(r'<acceleration:IQN-ILS>.*?</acceleration:IQN-ILS>', text, re.DOTALL)[0]
+            self.accelerated_data = _attributes("data", block)[0]["name"]
+            filters = _attributes("filter", block)
+            self.acceleration = IQNILSAcceleration(
+                float(_attributes("initial-relaxation", block)[0]["value"]),
+                int(_attributes("max-used-iterations", block)[0]["value"]),
+                int(_attributes("time-windows-reused", block)[0]["value"]),
+                float(filters[0]["limit"]) if filters else 0)
+
+        self.meshes = {}  # coordinates of the vertices of every mesh
+        self.values = {}  # data as sent to the receiving participant
+        self.sent = {}  # data sent at the beginning of the current iteration
+        self.old_values = {}  # data of the previous iteration for the convergence measures
+        self.condition = threading.Condition()
+        self.turn = None
+        self.time = 0
+        self.iterations = 0  # coupling iterations of the current time window
+        self.total_iterations = 0
+        self.windows = 0
+        self.converged = True
+        self.error = None
+
+    def wait_for(self, predicate):
+        """
+        Waits until predicate is fulfilled or a participant failed. Has to be called with the condition acquired.
+        """
+        self.condition.wait_for(lambda: predicate() or self.error is not None)
+        if self.error is not None:
+            raise RuntimeError("Coupling aborted: {}".format(self.error))
+
+    def abort(self, error):
+        with self.condition:
+            self.error = error
+            self.condition.notify_all()
+
+    def is_coupling_ongoing(self):
+        return self.time < self.max_time - 1e-10 * self.dt
+
+    def complete_iteration(self):
+        """
+        Evaluates the convergence measures and computes the input of the next iteration, called by the second
+        participant after both participants sent their data.
+        """
+        self.iterations += 1
+        self.total_iterations += 1
+        converged = all(data in self.old_values and
+                        np.linalg.norm(self.values[data] - self.old_values[data]) <=
+                        limit * np.linalg.norm(self.values[data])
+                        for data, limit in self.measures.items())
+
+        self.converged = converged or self.iterations >= self.max_iterations
+        self.old_values = {data: np.copy(values) for data, values in self.values.items()}
+        if self.converged:
+            self.time += self.dt
+            self.windows += 1
+            self.iterations = 0
+            if self.acceleration:
+                self.acceleration.complete_window()
+        elif self.acceleration:
+            data = self.accelerated_data
+            # the values sent in the last iteration are the input of the iteration
+            self.values[data] = self.acceleration.compute(self.sent[data], self.values[data])
+        self.sent = {data: np.copy(values) for data, values in self.values.items()}
+        # convergence of the accelerated data is measured between its input and output of the iteration
+        if self.accelerated_data in self.sent:
+            self.old_values[self.accelerated_data] = self.sent[self.accelerated_data]
+
+
+class Interface(object):
+    """
+    Stand-in for precice.Interface. All participants constructed with the same configuration file share one coupling
+    scheme.
+    """
+
+    _schemes = {}
+    _lock = threading.Lock()
+
+    def __init__(self, participant_name, configurationFileName, process_index, process_size):
+        assert process_size == 1, "The local interface only supports serial participants."
+        with Interface._lock:
+            if configurationFileName not in Interface._schemes:
+                Interface._schemes[configurationFileName] = SerialImplicitCoupling(configurationFileName)
+            self.scheme = Interface._schemes[configurationFileName]
+        self.name = participant_name
+        self.mesh_names = []
+        self.data_names = []
+        self.mappings = {}
+        self.written = {}
+        self.write_checkpoint = True
+        self.initial_data_written = False
+        self.is_first = participant_name == self.scheme.first
+
+    def get_dimensions(self):
+        return 2
+
+    def get_mesh_id(self, mesh_name):
+        self.mesh_names.append(mesh_name)
+        return len(self.mesh_names) - 1
+
+    def get_data_id(self, data_name, mesh_id):
+        self.data_names.append(data_name)
+        return len(self.data_names) - 1
+
+    def set_mesh_vertices(self, mesh_id, positions):
+        with self.scheme.condition:
+            self.scheme.meshes[self.mesh_names[mesh_id]] = np.copy(positions)
+            self.scheme.condition.notify_all()
+        return np.arange(positions.shape[0])
+
+    def _mapping(self, data_name):
+        """
+        Nearest-neighbor mapping of data_name from the mesh of the writing participant to the own mesh.
+        """
+        if data_name not in self.mappings:
+            exchange = [exchange for exchange in self.scheme.exchanges if exchange["data"] == data_name][0]
+            source = [mesh for mesh, participant in self.scheme.provided_meshes.items()
+                      if participant == exchange["from"]][0]
+            target = [mesh for mesh, participant in self.scheme.provided_meshes.items()
+                      if participant == self.name][0]
+            with self.scheme.condition:
+                self.scheme.wait_for(lambda: source in self.scheme.meshes and target in self.scheme.meshes)
+            # the k-d tree avoids the distance matrix of all pairs of vertices, which is too large for fine tubes
+            self.mappings[data_name] = cKDTree(self.scheme.meshes[source]).query(self.scheme.meshes[target])[1]
+        return self.mappings[data_name]
+
+    def _initialized_data(self):
+        return [exchange["data"] for exchange in self.scheme.exchanges
+                if exchange.get("initialize") == "true" and exchange["from"] == self.name]
+
+    def initialize(self):
+        with self.scheme.condition:
+            if self.scheme.turn is None:
+                self.scheme.turn = self.scheme.first
+        return self.scheme.dt
+
+    def is_action_required(self, action):
+        if action == action_write_initial_data():
+            return bool(self._initialized_data()) and not self.initial_data_written
+        elif action == action_write_iteration_checkpoint():
+            return self.write_checkpoint
+        elif action == action_read_iteration_checkpoint():
+            return not self.scheme.converged
+        return False
+
+    def mark_action_fulfilled(self, action):
+        if action == action_write_initial_data():
+            self.initial_data_written = True
+        elif action == action_write_iteration_checkpoint():
+            self.write_checkpoint = False
+
+    def _send(self):
+        for data_name, values in self.written.items():
+            self.scheme.values[data_name] = values
+        self.written = {}
+
+    def initialize_data(self):
+        scheme = self.scheme
+        with scheme.condition:
+            self._send()
+            scheme.sent = {data: np.copy(values) for data, values in scheme.values.items()}
+            scheme.condition.notify_all()
+            if self.is_first:
+                # wait for the initial data of the second participant
+                initialized = [exchange["data"] for exchange in scheme.exchanges
+                               if exchange.get("initialize") == "true" and exchange["from"] == scheme.second]
+                scheme.wait_for(lambda: all(data in scheme.values for data in initialized))
+            else:
+                # wait for the data of the first iteration of the first participant
+                scheme.wait_for(lambda: scheme.turn == scheme.second)
+
+    def is_read_data_available(self):
+        return True
+
+    def write_block_scalar_data(self, data_id, vertex_ids, values):
+        self.written[self.data_names[data_id]] = np.array(values, dtype=float)
+
+    def read_block_scalar_data(self, data_id, vertex_ids):
+        data_name = self.data_names[data_id]
+        mapping = self._mapping(data_name)
+        with self.scheme.condition:
+            return self.scheme.values[data_name][mapping][vertex_ids]
+
+    def advance(self, dt):
+        scheme = self.scheme
+        with scheme.condition:
+            self._send()
+            if self.is_first:
+                scheme.turn = scheme.second
+                scheme.condition.notify_all()
+                scheme.wait_for(lambda: scheme.turn == scheme.first)
+            else:
+                scheme.complete_iteration()
+                scheme.turn = scheme.first
+                scheme.condition.notify_all()
+                if scheme.is_coupling_ongoing():
+                    scheme.wait_for(lambda: scheme.turn == scheme.second)
+            if scheme.converged:
+                self.write_checkpoint = True
+        return scheme.dt
+
+    def is_coupling_ongoing(self):
+        return self.scheme.is_coupling_ongoing()
+
+    def finalize(self):
+        pass
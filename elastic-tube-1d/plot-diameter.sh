@@ -11,7 +11,7 @@ else
 fi
 
 # Plot diameter from fluid-python
-if [ -n "$(ls -A ./fluid-python/output/*.vtk 2>/dev/null)" ]; then
+if [ -n "$(ls -A ./fluid-python/output/*.vtk ./fluid-python/output/*.vtu 2>/dev/null)" ]; then
     python3 plot-vtk.py diameter fluid-python/output/out_fluid_ &
 else
     echo "No results to plot from fluid-python."
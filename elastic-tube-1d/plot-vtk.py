@@ -1,73 +1,86 @@
 #!/usr/bin/python
 
 import vtk
+from vtk.util.numpy_support import vtk_to_numpy
 import numpy as np
 import os
 import sys
+from concurrent.futures import ProcessPoolExecutor
 import matplotlib.pyplot as plt
 from mpl_toolkits.mplot3d import Axes3D
 
-T = 100  # number of timesteps performed
-
 arrayname = sys.argv[1]  # Which dataset should be plotted?
 data_path = sys.argv[2]  # Where is the data?
 
+# binary XML files written by fluid-python are preferred over legacy VTK files
+extension = ".vtu" if os.path.exists(data_path + "0.vtu") else ".vtk"
 
-def file_name_generator(id): return data_path + str(id) + ".vtk"
-
-
-print("reading data from array with name = %s" % arrayname)
-print("parsing datasets named %s*.vtk" % data_path)
-
-values_for_all_t = T * [None]
 
+def file_name_generator(id): return data_path + str(id) + extension
 
-for t in range(T):
 
+def read_file(filename):
+    """
+    Reads the coordinates of the points and the norm of the requested array from a single file.
+    """
     # read the vtk file as an unstructured grid
-    reader = vtk.vtkUnstructuredGridReader()
-    reader.SetFileName(file_name_generator(t))
-    reader.ReadAllVectorsOn()
-    reader.ReadAllScalarsOn()
+    if extension == ".vtu":
+        reader = vtk.vtkXMLUnstructuredGridReader()
+    else:
+        reader = vtk.vtkUnstructuredGridReader()
+        reader.ReadAllVectorsOn()
+        reader.ReadAllScalarsOn()
+    reader.SetFileName(filename)
     reader.Update()
 
     # parse the data
     grid = reader.GetOutput()
     point_data = grid.GetPointData().GetArray(arrayname)
-    points = grid.GetPoints()
-    N = grid.GetNumberOfPoints()  # How many gridpoints do exist?
 
     if point_data is None:  # check if array exists in dataset
-        print("array with name %s does not exist!" % arrayname)
-        print("exiting.")
-        quit()
+        return None, None
 
-    value_at_t = []
-    spatial_mesh = []
+    spatial_mesh = vtk_to_numpy(grid.GetPoints().GetData())[:, 0]  # only store x component
+    values = vtk_to_numpy(point_data)
+    if values.ndim > 1:  # vectors are reduced to their norm
+        values = np.linalg.norm(values, axis=1)
+    return spatial_mesh, values
 
-    n = point_data.GetNumberOfComponents()
 
-    for i in range(N):  # parse data from vtk array into list
+if __name__ == "__main__":
+    print("reading data from array with name = %s" % arrayname)
+    print("parsing datasets named %s*%s" % (data_path, extension))
 
-        x, y, z = grid.GetPoint(i)  # read coordinates of point
-        spatial_mesh += [x]  # only store x component
+    T = 0  # number of timesteps performed
+    while os.path.exists(file_name_generator(T)):
+        T += 1
 
-        v = np.zeros(n)  # initialize empty butter array
-        point_data.GetTuple(i, v)  # read value into v
-        value_at_t += [np.linalg.norm(v)]
+    if T == 0:
+        print("no datasets found!")
+        print("exiting.")
+        quit()
+
+    print("found %i datasets" % T)
 
-    values_for_all_t[t] = value_at_t
+    # read files concurrently, each file is read and converted independently
+    with ProcessPoolExecutor() as executor:
+        results = list(executor.map(read_file, map(file_name_generator, range(T)), chunksize=max(1, T // 64)))
 
+    spatial_mesh = results[0][0]
+    if spatial_mesh is None:
+        print("array with name %s does not exist!" % arrayname)
+        print("exiting.")
+        quit()
 
-values_for_all_t = np.array(values_for_all_t)
+    values_for_all_t = np.array([values for _, values in results])
 
-fig = plt.figure()
-ax = fig.add_subplot(111, projection='3d')
-X, Y = np.meshgrid(spatial_mesh, range(T))
+    fig = plt.figure()
+    ax = fig.add_subplot(111, projection='3d')
+    X, Y = np.meshgrid(spatial_mesh, range(T))
 
-# uncomment depending on what quantity you want to plot
-ax.plot_surface(X, Y, values_for_all_t, cmap='viridis', edgecolor='black')
-plt.xlabel("space")
-plt.ylabel("time")
-plt.title(arrayname + " from " + data_path + "*.vtk")
-plt.show()
+    # uncomment depending on what quantity you want to plot
+    ax.plot_surface(X, Y, values_for_all_t, cmap='viridis', edgecolor='black')
+    plt.xlabel("space")
+    plt.ylabel("time")
+    plt.title(arrayname + " from " + data_path + "*" + extension)
+    plt.show()
@@ -0,0 +1,116 @@
+#!/usr/bin/python
+"""
+Runs fluid-python and solid-python coupled in a single Python process. Both participants run unchanged in their own
+thread and are coupled through the local stand-in for the preCICE Python bindings in localInterface.py, which
+implements the coupling scheme of precice-config.xml. Since no sockets are involved, this is useful to profile and
+benchmark the solvers end to end.
+
+Arguments that are not listed below are passed on to FluidSolver.py, e.g.
+
+    python3 run-in-process.py --nonlinear-solver chord --output-format npz
+"""
+
+from __future__ import division, print_function
+import argparse
+import cProfile
+import os
+import runpy
+import sys
+import threading
+import time
+import numpy as np
+import localInterface
+
+here = os.path.dirname(os.path.abspath(__file__))
+
+parser = argparse.ArgumentParser(description="Runs the Python fluid and solid participants coupled in one process.")
+parser.add_argument("--precice-config", help="Name of the xml precice configuration file.", type=str,
+                    default=os.path.join(here, "precice-config.xml"))
+parser.add_argument("--N", help="Number of cells, passed on to both participants.", type=int)
+parser.add_argument("--grid-stretching", help="Grid stretching, passed on to both participants, see FluidSolver.py.",
+                    type=float)
+parser.add_argument("--profile", help="Profile both participants and write the statistics to \
+                    'fluid-python/output/profile_<participant>.prof'.", action='store_true')
+
+
+def run_participant(name, script, argv, statistics, profile):
+    """
+    Runs a participant script in the current thread. Errors abort the coupling, such that the other participant does
+    not wait forever.
+    """
+    sys.argv = [script] + argv
+    tic = time.perf_counter()
+    profiler = cProfile.Profile() if profile else None
+    try:
+        if profiler:
+            profiler.runcall(runpy.run_path, script, run_name="__main__")
+        else:
+            runpy.run_path(script, run_name="__main__")
+    except BaseException as error:
+        for scheme in localInterface.Interface._schemes.values():
+            scheme.abort("{} failed with {!r}".format(name, error))
+        raise
+    finally:
+        statistics[name] = {"wall_time": time.perf_counter() - tic, "cpu_time": time.thread_time()}
+        if profiler:
+            profiler.dump_stats(os.path.join("output", "profile_{}.prof".format(name)))
+
+
+if __name__ == "__main__":
+    args, fluid_argv = parser.parse_known_args()
+    configurationFileName = os.path.abspath(args.precice_config)
+
+    # the participants import precice, use the local interface instead
+    sys.modules["precice"] = localInterface
+    sys.path.insert(0, os.path.join(here, "fluid-python"))
+    os.chdir(os.path.join(here, "fluid-python"))  # the fluid writes its output relative to its directory
+    if not os.path.exists("output"):
+        os.mkdir("output")
+
+    # grid parameters have to match in both participants
+    grid_argv = []
+    if args.N is not None:
+        grid_argv += ["--N", str(args.N)]
+    if args.grid_stretching is not None:
+        grid_argv += ["--grid-stretching", str(args.grid_stretching)]
+
+    statistics = {}
+    threads = []
+    tic = time.perf_counter()
+    for name, script, argv in [("Fluid", os.path.join(here, "fluid-python", "FluidSolver.py"),
+                                [configurationFileName] + grid_argv + fluid_argv),
+                               ("Solid", os.path.join(here, "solid-python", "SolidSolver.py"),
+                                [configurationFileName] + grid_argv)]:
+        thread = threading.Thread(target=run_participant, args=(name, script, argv, statistics, args.profile))
+        thread.start()
+        # sys.argv is shared by the threads, wait until the participant parsed its arguments and created its interface
+        while thread.is_alive() and not localInterface.Interface._schemes:
+            time.sleep(.01)
+        threads.append(thread)
+        if not localInterface.Interface._schemes:
+            break  # the participant failed before creating its interface, do not start the other one
+    for thread in threads:
+        thread.join()
+    wall_time = time.perf_counter() - tic
+
+    schemes = list(localInterface.Interface._schemes.values())
+    if not schemes or schemes[0].error is not None:
+        print("Coupled simulation failed: {}".format(
+            schemes[0].error if schemes else "a participant failed during setup"))
+        raise SystemExit(1)
+    scheme = schemes[0]
+
+    # the participants create their grids independently, the nearest-neighbor mapping would hide a mismatch
+    meshes = list(scheme.meshes.values())
+    if any(mesh.shape != meshes[0].shape or not np.allclose(mesh, meshes[0], rtol=0, atol=1e-12 * np.abs(
+            meshes[0]).max()) for mesh in meshes[1:]):
+        print("Coupled simulation failed: the meshes of the participants do not match")
+        raise SystemExit(1)
+
+    print("")
+    print("Time windows: {}, coupling iterations: {} ({:.2f} per window)".format(
+        scheme.windows, scheme.total_iterations, scheme.total_iterations / max(scheme.windows, 1)))
+    print("Wall time: {:.3f} s ({:.3f} s per window)".format(wall_time, wall_time / max(scheme.windows, 1)))
+    # the second participant also evaluates the convergence measures and the acceleration of the coupling scheme
+    for name, entry in statistics.items():
+        print("{}: CPU time {:.3f} s".format(name, entry["cpu_time"]))
@@ -1,9 +1,8 @@
 from __future__ import division, print_function
 
-import os
-import sys
 import argparse
 import numpy as np
+from mpi4py import MPI
 import precice
 from precice import action_write_initial_data, action_read_iteration_checkpoint, \
     action_write_iteration_checkpoint
@@ -23,11 +22,31 @@ def crossSection0(N):
     return a0 * np.ones(N + 1)
 
 
+def create_grid(N, L, stretching):
+    """
+    Nodes of the tube, same grid as create_grid in fluid-python/thetaScheme.py. run-in-process.py checks that the meshes
+    of both participants match. The tube law is evaluated pointwise and does not depend on the cell lengths.
+    """
+    if stretching == 0:
+        return np.linspace(0, L, N + 1)
+    return L * np.expm1(stretching * np.linspace(0, 1, N + 1)) / np.expm1(stretching)
+
+
 print("Starting Solid Solver...")
 
 parser = argparse.ArgumentParser()
 parser.add_argument("configurationFileName", help="Name of the xml config file.", nargs='?', type=str,
                     default="precice-config.xml")
+parser.add_argument("--N", help="Number of cells of the tube, has to match the fluid.", type=int, default=N)
+parser.add_argument("--grid-stretching", help="Grid stretching of the fluid, see FluidSolver.py.", type=float,
+                    default=0)
+parser.add_argument("--write-reference", help="Gather the pressure and the cross section of all MPI ranks after every \
+                    time window and save them to the given .npy file, e.g. in a serial run.", type=str)
+parser.add_argument("--verify", help="Gather the pressure and the cross section of all MPI ranks after every time \
+                    window and compare them to the given file written by a serial run with --write-reference.",
+                    type=str)
+parser.add_argument("--verify-tolerance", help="Maximum deviation from the reference relative to the maximum of the \
+                    reference, see --verify.", type=float, default=1e-8)
 
 try:
     args = parser.parse_args()
@@ -37,30 +56,44 @@ except SystemExit:
     print("Try '$ python SolidSolver.py precice-config.xml'")
     quit()
 
+N = args.N
 print("N: " + str(N))
 
+# the tube law is evaluated pointwise, therefore every MPI rank owns a contiguous block of the vertices
+comm = MPI.COMM_WORLD
+rank, size = comm.Get_rank(), comm.Get_size()
+if size > N + 1:
+    if rank == 0:
+        print("The solid cannot run on more MPI ranks ({}) than there are vertices ({}).".format(size, N + 1))
+    quit()
+vertices = np.array_split(np.arange(N + 1), size)[rank]
+print("Solid rank {} of {}: vertices {} to {}".format(rank, size, vertices[0], vertices[-1]))
+
 print("Configure preCICE...")
-interface = precice.Interface("Solid", args.configurationFileName, 0, 1)
+interface = precice.Interface("Solid", args.configurationFileName, rank, size)
 print("preCICE configured...")
 
 dimensions = interface.get_dimensions()
 
-pressure = p0 * np.ones(N + 1)
-crossSectionLength = a0 * np.ones(N + 1)
+pressure = p0 * np.ones(vertices.shape[0])
+crossSectionLength = a0 * np.ones(vertices.shape[0])
 
 meshID = interface.get_mesh_id("Solid-Nodes-Mesh")
 crossSectionLengthID = interface.get_data_id("CrossSectionLength", meshID)
 pressureID = interface.get_data_id("Pressure", meshID)
 
-vertexIDs = np.zeros(N + 1)
-grid = np.zeros([N + 1, dimensions])
+vertexIDs = np.zeros(vertices.shape[0])
+grid = np.zeros([vertices.shape[0], dimensions])
 
-grid[:, 0] = np.linspace(0, L, N + 1)  # x component
+grid[:, 0] = create_grid(N, L, args.grid_stretching)[vertices]  # x component
 grid[:, 1] = 0  # np.linspace(0, config.L, N+1)  # y component, leave blank
 
 vertexIDs = interface.set_mesh_vertices(meshID, grid)
 
 t = 0
+windows = []  # gathered pressure and cross section of every time window, only on rank 0
+if args.verify and rank == 0:
+    reference = np.load(args.verify)
 
 print("Solid: init precice...")
 
@@ -88,6 +121,7 @@ while interface.is_coupling_ongoing():
         (pressure0 - 2.0 * c_mk ** 2) ** 2 / (pressure - 2.0 * c_mk ** 2) ** 2)
 
     interface.write_block_scalar_data(crossSectionLengthID, vertexIDs, crossSectionLength)
+    pressure_converged = pressure  # input of crossSectionLength, for verification
     precice_dt = interface.advance(precice_dt)
     pressure = interface.read_block_scalar_data(pressureID, vertexIDs)
 
@@ -95,7 +129,32 @@ while interface.is_coupling_ongoing():
         interface.mark_action_fulfilled(action_read_iteration_checkpoint())
     else:
         t += precice_dt
+        if args.write_reference or args.verify:
+            pressure_all = comm.gather(pressure_converged, root=0)
+            crossSectionLength_all = comm.gather(crossSectionLength, root=0)
+            if rank == 0:
+                windows.append(np.array([np.concatenate(pressure_all), np.concatenate(crossSectionLength_all)]))
+        if args.verify and rank == 0:
+            # compare to the serial run, which got the same pressure if the partitioned solid is correct
+            if len(windows) > reference.shape[0]:
+                print("Solid: the reference ends before t = {}".format(t))
+                comm.Abort(1)
+            if windows[-1].shape != reference.shape[1:]:
+                print("Solid: the gathered vertices do not match the {} vertices of the reference".format(
+                    reference.shape[2]))
+                comm.Abort(1)
+            deviation = np.max(np.abs(windows[-1] - reference[len(windows) - 1]), axis=1) / \
+                np.max(np.abs(reference[len(windows) - 1]), axis=1)
+            if np.any(deviation > args.verify_tolerance):
+                print("Solid: partitioned result differs from the serial result at t = {}, relative deviation of the "
+                      "pressure {:e}, of the cross section {:e}".format(t, *deviation))
+                comm.Abort(1)
 
 print("Exiting SolidSolver")
 
+if args.write_reference and rank == 0:
+    np.save(args.write_reference, np.array(windows))
+if args.verify and rank == 0:
+    print("Solid: {} time windows agree with the serial result".format(len(windows)))
+
 interface.finalize()